@@ -9,6 +9,9 @@ from flask_bootstrap import Bootstrap
 
 from .base import base_blueprint
 from .menus import menus_blueprint
+from .menus import models
+from .menus.core import refresher
+from .utils import networking
 
 logging.basicConfig(
     filename=Path(__file__).parent.parent / "flask-app.log",
@@ -38,6 +41,9 @@ def create_app(config_object):
     flask_app.config.from_object(config_object)
 
     Bootstrap(flask_app)
+    models.init_app(flask_app)
+    refresher.init_app(flask_app)
+    networking.init_app(flask_app)
     flask_app.register_blueprint(base_blueprint)
     flask_app.register_blueprint(menus_blueprint)
 
@@ -1,11 +1,12 @@
 """Base routes of the flask application."""
 import logging
 
-from flask import redirect, request, url_for
+from flask import jsonify, redirect, request, url_for
 from flask.helpers import flash
 from flask.templating import render_template
 
 from app.menus.core.utils import get_last_menus_url
+from app.utils.networking import downloader
 
 from . import base_blueprint
 
@@ -85,6 +86,12 @@ def source():
     return redirect(get_last_menus_url())
 
 
+@base_blueprint.route("/api/status")
+def status():
+    """Returns the status of the downloader's circuit breaker, for monitoring."""
+    return jsonify({"downloader": downloader.circuit_breaker.get_status()})
+
+
 @base_blueprint.route("/feedback")
 def feedback():
     """States the admin email to send feedback to."""
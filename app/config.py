@@ -12,14 +12,34 @@ class Config:
     TEST_DATA_PATH: Path = ROOT_PATH / "tests" / "data"
     TESTING: bool = False
     DATABASE_PATH: Path = ROOT_PATH.parent.joinpath("flask.db")
+    DATABASE_POOL_SIZE: int = 5
     IS_LINUX: bool = platform.system() == "Linux"
     TOKEN_FILE_PATH = ROOT_PATH / "VALID_TOKENS"
     OFFLINE = False
     ADMIN_EMAIL = "sralloza@gmail.com"
+    BACKGROUND_REFRESH: bool = True
+    REFRESH_INTERVAL: int = 60 * 60
+    PARSER_WORKERS: int = 4
+    PARSER_PROCESSES: int = 0
+    CRAWLER_CONCURRENCY: int = 4
+    CRAWLER_LOOKAHEAD: int = 4
+    PARSE_CACHE: bool = True
+    CONDITIONAL_REQUESTS: bool = True
+    DOWNLOADER_RETRIES: int = 5
+    DOWNLOADER_CONNECT_TIMEOUT: float = 5
+    DOWNLOADER_READ_TIMEOUT: float = 30
+    DOWNLOADER_BACKOFF: float = 0.5
+    DOWNLOADER_BACKOFF_MAX: float = 30
+    DOWNLOADER_POOL_CONNECTIONS: int = 10
+    DOWNLOADER_POOL_MAXSIZE: int = 10
+    CIRCUIT_BREAKER_THRESHOLD: int = 3
+    CIRCUIT_BREAKER_COOLDOWN: int = 5 * 60
 
 
 class TestingConfig(Config):
     """Config class to use during tests."""
     TESTING: bool = True
+    BACKGROUND_REFRESH: bool = False
+    DOWNLOADER_BACKOFF: float = 0
     DATABASE_PATH: Path = Path(Config.DATABASE_PATH).with_name("test-flask.db")
     SERVER_NAME: str = "menus.sralloza.es"
@@ -0,0 +1,148 @@
+"""Asynchronous crawler of the blog pages."""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from app.menus.core.utils import TEMPLATE, _get_page_urls
+from app.menus.models import HttpCache
+from app.utils.exceptions import CircuitOpenError, DownloaderError
+
+logger = logging.getLogger(__name__)
+
+
+class Crawler:
+    """Crawls every page of the blog to find the menus urls.
+
+    Pages are fetched concurrently (at most `concurrency` at the same time),
+    and the next pages are requested speculatively (up to `lookahead` pages
+    ahead of the last one fetched) before knowing if they exist. The urls
+    found are passed to a callback as soon as their page is fetched.
+
+    The downloads are made by the (thread-safe) downloader, in a pool of
+    `concurrency` threads.
+
+    Args:
+        concurrency (int, optional): maximum number of pages fetched at the
+            same time. Defaults to 4.
+        lookahead (int, optional): maximum number of pages requested ahead.
+            Defaults to 4.
+        http_cache (HttpCache, optional): if set, the pages are downloaded with
+            conditional requests. Defaults to None.
+        template (str, optional): template of the urls of the pages.
+            Defaults to `TEMPLATE`.
+    """
+
+    def __init__(self, concurrency=4, lookahead=4, http_cache=None, template=TEMPLATE):
+        self.concurrency = concurrency
+        self.lookahead = lookahead
+        self.http_cache = http_cache
+        self.template = template
+
+    def run(self, on_url=None):
+        """Crawls the blog, blocking until it finishes.
+
+        Args:
+            on_url (callable, optional): called with each url found, as soon
+                as it is found. Defaults to None.
+
+        Returns:
+            list of str: menus urls, from newest to oldest.
+        """
+        return asyncio.run(self.crawl(on_url))
+
+    async def crawl(self, on_url=None):
+        """Crawls the blog.
+
+        Args:
+            on_url (callable, optional): called with each url found, as soon
+                as it is found. Defaults to None.
+
+        Returns:
+            list of str: menus urls, from newest to oldest.
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix="Crawler")
+
+        pages = {}
+        pending = set()
+        end = None
+        next_index = 1
+
+        async def fetch(index):
+            url = self.template % index
+            async with semaphore:
+                try:
+                    page_urls = await loop.run_in_executor(
+                        executor, _get_page_urls, url, self.http_cache
+                    )
+                except CircuitOpenError:
+                    logger.warning("Circuit open, crawl stopped at %r", url)
+                    return index, None
+                except DownloaderError:
+                    logger.warning("Could not retrieve url %r", url)
+                    return index, []
+
+            return index, page_urls
+
+        try:
+            while True:
+                while len(pending) < self.lookahead and (
+                    end is None or next_index < end
+                ):
+                    pending.add(asyncio.ensure_future(fetch(next_index)))
+                    next_index += 1
+
+                if not pending:
+                    break
+
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+
+                for task in done:
+                    index, page_urls = task.result()
+                    if page_urls is None:
+                        end = index if end is None else min(end, index)
+                        continue
+
+                    pages[index] = page_urls
+                    if on_url is not None:
+                        for url in page_urls:
+                            on_url(url)
+        finally:
+            for task in pending:
+                task.cancel()
+            executor.shutdown(wait=False)
+
+        logger.debug("Crawled %d pages", len(pages))
+        return [url for index in sorted(pages) if index < end for url in pages[index]]
+
+    @classmethod
+    def from_config(cls):
+        """Returns a crawler configured with the app's config."""
+        http_cache = None
+        if current_app.config["CONDITIONAL_REQUESTS"]:
+            http_cache = HttpCache(current_app.config["DATABASE_PATH"])
+
+        return cls(
+            concurrency=current_app.config["CRAWLER_CONCURRENCY"],
+            lookahead=current_app.config["CRAWLER_LOOKAHEAD"],
+            http_cache=http_cache,
+        )
+
+
+def crawl_menus_urls(on_url=None):
+    """Crawls every page of the blog, using the app's config. It is the
+    synchronous interface of `Crawler`.
+
+    Args:
+        on_url (callable, optional): called with each url found, as soon as it
+            is found. Defaults to None.
+
+    Returns:
+        list of str: menus urls, from newest to oldest.
+    """
+    return Crawler.from_config().run(on_url)
@@ -2,13 +2,17 @@
 import logging
 import re
 from datetime import date
+from pathlib import Path
 from threading import Lock
 from typing import List, Union
 
+from flask import current_app
+
 from app.menus.core.parser import Parsers
+from app.menus.core.refresher import refresher
 from app.menus.core.utils import get_menus_urls
 from app.menus.models import DailyMenusDatabaseController, UpdateControl
-from app.utils import now
+from app.utils import FileLock, now
 
 from .structure import DailyMenu
 
@@ -16,13 +20,27 @@ logger = logging.getLogger(__name__)
 _M = Union[DailyMenu, List[DailyMenu]]
 
 
+class _UpdateFlight:
+    """Static class to make sure only one update runs at the same time in
+    the process. `generation` is increased every time an update finishes."""
+
+    lock = Lock()
+    generation = 0
+
+
 class DailyMenusManager:
-    """Represents a controller of a list of menus."""
+    """Represents a controller of a list of menus.
+
+    Menus are stored in a list (`menus`), which keeps the order, and indexed by
+    date in a dict (`_index`), so lookups don't need to scan the list.
+    """
 
     def __init__(self):
         self.updated = False
+        self.refreshing = False
         self.today_not_in_self = None
         self.menus = []
+        self._index = {}
         self._lock = Lock()
 
     def __str__(self):
@@ -40,7 +58,7 @@ class DailyMenusManager:
                 f"Contains does only work with dates, not {type(item).__name__}"
             )
 
-        return item in (x.date for x in self.menus)
+        return item in self._index
 
     def __iter__(self):
         return iter(self.menus)
@@ -51,11 +69,10 @@ class DailyMenusManager:
                 f"Getitem does only work with dates, not {type(item).__name__}"
             )
 
-        for menu in self.menus:
-            if menu.date == item:
-                return menu
-
-        raise KeyError(f"No menu found: {item}")
+        try:
+            return self._index[item]
+        except KeyError:
+            raise KeyError(f"No menu found: {item}") from None
 
     def sort(self):
         """Sorts menus by date."""
@@ -82,16 +99,13 @@ class DailyMenusManager:
             if isinstance(menus, DailyMenu):
                 menus = [menus]
 
-            existing_dates = [x.date for x in self.menus]
-            new_menus = []
             for menu in menus:
-                if menu.date not in existing_dates:
-                    new_menus.append(menu)
-
-            self.menus += new_menus
+                if menu.date not in self._index:
+                    self._index[menu.date] = menu
+                    self.menus.append(menu)
 
     @classmethod
-    def load(cls, force=None, parse_all=False):
+    def load(cls, force=None, parse_all=False, background=None):
         """Loads the menus, from the database and from the menus web server (only if
         UpdateControl authorizes it).
 
@@ -99,6 +113,9 @@ class DailyMenusManager:
             force (bool): if True, download menus from the web server even if today is
                 in the database. Otherwise, it won't affect. Defaults to None.
             parse_all (bool): if True, the system will parse every url found on the server.
+            background (bool): if True, the update is made by the background refresher
+                and only the menus of the database are returned. If parse_all is True,
+                it's ignored. Defaults to None (uses config's BACKGROUND_REFRESH).
         """
 
         self = DailyMenusManager()
@@ -112,14 +129,17 @@ class DailyMenusManager:
         if force:
             update = True
 
-        # UpdateControl is more important than force
-        update_control_return = UpdateControl.should_update()
-        if not update_control_return:
-            logger.info(
-                "Permission denied by UpdateControl (%s)",
-                UpdateControl.get_last_update(),
-            )
-            update = False
+        # UpdateControl is more important than force. It is only checked if
+        # needed, so loading today's menus doesn't query the database again.
+        update_control_return = None
+        if update:
+            update_control_return = UpdateControl.should_update()
+            if not update_control_return:
+                logger.info(
+                    "Permission denied by UpdateControl (%s)",
+                    UpdateControl.get_last_update(),
+                )
+                update = False
 
         if parse_all:
             logger.info("Parse_all override the final decision (%s)", update)
@@ -133,20 +153,69 @@ class DailyMenusManager:
             update,
         )
 
-        self.updated = update
-        if update:
-            urls = get_menus_urls(request_all=parse_all)
-
-            for url in urls:
-                Parsers.parse(url, self)
+        if background is None:
+            background = current_app.config["BACKGROUND_REFRESH"]
 
-            Parsers.join()
-            UpdateControl.set_last_update()
-            self.save_to_database()
+        self.updated = update
+        if update and background and not parse_all:
+            refresher.request_update()
+            self.refreshing = True
+        elif update:
+            self.update_from_web(parse_all=parse_all)
 
         self.sort()
         return self
 
+    def update_from_web(self, parse_all=False):
+        """Downloads and parses the menus from the menus web server and saves
+        them to the database.
+
+        Only one update runs at the same time, even between processes (using a
+        lock file next to the database). If an update is already running, this
+        method waits for it to finish and loads its result from the database
+        instead of starting another one (unless `parse_all` is True).
+
+        Args:
+            parse_all (bool): if True, the system will parse every url found on the server.
+
+        Returns:
+            bool: True if the update was made by this call, False if the result
+                of other update was reused.
+        """
+        generation = _UpdateFlight.generation
+        database_path = Path(current_app.config["DATABASE_PATH"])
+        file_lock = FileLock(database_path.with_name(database_path.name + ".lock"))
+
+        with _UpdateFlight.lock:
+            if _UpdateFlight.generation != generation and not parse_all:
+                logger.info("Reusing update made by other thread")
+                self.load_from_database()
+                return False
+
+            if not file_lock.acquire(blocking=False):
+                logger.info("Update running in other process, waiting for it")
+                file_lock.acquire()
+                if not parse_all:
+                    file_lock.release()
+                    logger.info("Reusing update made by other process")
+                    self.load_from_database()
+                    return False
+
+            try:
+                # Urls are parsed as soon as they are found
+                with Parsers.group() as group:
+                    get_menus_urls(
+                        request_all=parse_all, on_url=lambda x: group.parse(x, self)
+                    )
+
+                UpdateControl.set_last_update()
+                self.save_to_database()
+            finally:
+                file_lock.release()
+                _UpdateFlight.generation += 1
+
+        return True
+
     def to_json(self):
         """Returns the json representation of the menus."""
 
@@ -170,8 +239,17 @@ class DailyMenusManager:
         self.add_to_menus(DailyMenusDatabaseController.list_menus())
 
     def save_to_database(self):
-        """Saves the menus from the database."""
+        """Saves the menus to the database.
+
+        Returns:
+            BulkSaveResult: number of menus inserted and skipped.
+        """
 
         logger.debug("Saving menus to database")
-        for menu in self:
-            menu.to_database()
+        result = DailyMenusDatabaseController.save_daily_menus(self.menus)
+        logger.info(
+            "Saved menus to database (inserted=%d, skipped=%d)",
+            result.inserted,
+            result.skipped,
+        )
+        return result
@@ -1,11 +1,14 @@
 import logging
-from collections import UserList
-from threading import Lock, Thread
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from threading import Lock
+
+from flask import current_app
 
 from app.menus.core.exceptions import ParserError
 from app.menus.core.parser.abc import BaseParser
 from app.menus.core.parser.html_parser import HtmlParser
 from app.menus.core.parser.manual_parser import ManualParser
+from app.menus.models import HttpCache, ParseCache
 from app.utils.exceptions import DownloaderError
 from app.utils.networking import downloader
 
@@ -18,91 +21,309 @@ KNOWN_UNPARSEABLE_URLS = (
 )
 
 
-class ParserThread(Thread):
-    """Thread made to control."""
+def parse_text(dmm, text, url):
+    """Parses the text downloaded from the url with the first parser that can
+    process it, linking the menus to dmm.
+
+    Args:
+        dmm (DailyMenusManager): DMM instance to link the menus to.
+        text (str): text downloaded from url.
+        url (str): url from which the text was downloaded.
+
+    Raises:
+        ParserError: if none of the parsers can parse the text.
+    """
+    for parser in Parsers.parsers:
+        try:
+            logger.debug("Trying with parser %r", parser.__name__)
+            parser.process_text(dmm=dmm, text=text, url=url)
+            logger.info("URL parsed correcty with parser %r", parser.__name__)
+            return
+        except:
+            logger.exception(
+                "Exception parsing %r using parser %r:", url, parser.__name__
+            )
+            continue
+
+    logger.error("None of the parsers could parse url %r", url)
+    raise ParserError("None of the parsers could parse url %r" % url)
+
+
+def parse_menus(text, url):
+    """Parses the text like `parse_text`, but returns the menus instead of
+    linking them to a DMM, so it can also be run in other process.
+
+    Args:
+        text (str): text downloaded from url.
+        url (str): url from which the text was downloaded.
 
-    def __init__(self, url, dmm):
-        super().__init__()
+    Returns:
+        list of DailyMenu: menus parsed.
+    """
+    from app.menus.core.daily_menus_manager import DailyMenusManager
+
+    dmm = DailyMenusManager()
+    parse_text(dmm, text, url)
+    return dmm.menus
+
+
+class ParserJob:
+    """Job that downloads and parses the menus of an url. It is run by
+    the workers of `Parsers`.
+
+    Args:
+        url (str): url to get the menus from.
+        dmm (DailyMenusManager): DMM instance.
+        process_executor (concurrent.futures.ProcessPoolExecutor, optional): if
+            set, the text is parsed in other process. Defaults to None.
+        parse_cache (ParseCache, optional): if set, the menus of pages already
+            parsed are taken from it instead of parsing the text again.
+            Defaults to None.
+        http_cache (HttpCache, optional): if set (along with parse_cache), the
+            url is downloaded with a conditional request, and if it hasn't
+            changed the menus are taken from parse_cache. Defaults to None.
+    """
+
+    def __init__(
+        self, url, dmm, process_executor=None, parse_cache=None, http_cache=None
+    ):
         self.url = url
         self.dmm = dmm
+        self.process_executor = process_executor
+        self.parse_cache = parse_cache
+        self.http_cache = http_cache
 
-    def run(self):
-        logger.debug("Starting %s with url %r", self.name, self.url)
+    @property
+    def conditional(self):
+        """Returns whether the url is downloaded with a conditional request."""
+        return self.http_cache is not None and self.parse_cache is not None
 
-        if self.url in KNOWN_UNPARSEABLE_URLS:
-            logger.warning("Skipped url because its in KNOWN_UNPARSEABLE_URLS")
-            return
+    def download(self):
+        """Downloads the url, using a conditional request if possible.
+
+        Returns:
+            requests.Response: response of the server.
+
+        Raises:
+            DownloaderError: if the url can't be downloaded.
+        """
+        entry = None
+        if self.conditional:
+            entry = self.http_cache.get(self.url)
 
         try:
-            response = downloader.get(self.url)
+            if entry is None:
+                return downloader.get(self.url)
+            return downloader.conditional_get(
+                self.url, entry.etag, entry.last_modified
+            )
         except DownloaderError as exc:
             logger.error("Fatal connection error downloading %s", self.url)
             raise DownloaderError(
                 "Fatal connection error downloading %s" % self.url
             ) from exc
 
-        for parser in Parsers.parsers:
-            try:
-                logger.debug("Trying with parser %r", parser.__name__)
-                parser.process_text(dmm=self.dmm, text=response.text, url=self.url)
-                logger.info("URL parsed correcty with parser %r", parser.__name__)
+    def run(self):
+        """Downloads the url and parses it with the first parser that can
+        process its text. The menus are merged into the DMM.
+
+        Raises:
+            DownloaderError: if the url can't be downloaded.
+            ParserError: if none of the parsers can parse the url.
+        """
+        logger.debug("Starting job with url %r", self.url)
+
+        if self.url in KNOWN_UNPARSEABLE_URLS:
+            logger.warning("Skipped url because its in KNOWN_UNPARSEABLE_URLS")
+            return
+
+        response = self.download()
+
+        if response.status_code == 304:
+            menus = self.parse_cache.get(self.url)
+            if menus is None:
+                # Parse cache lost, so the next request must not be conditional
+                logger.warning("URL not modified, but not cached (%r)", self.url)
+                self.http_cache.set(self.url, None, None)
                 return
-            except:
-                logger.exception(
-                    "Exception parsing %r using parser %r:", self.url, parser.__name__
-                )
-                continue
 
-        logger.error("None of the parsers could parse url %r", self.url)
-        raise ParserError("None of the parsers could parse url %r" % self.url)
+            logger.info("URL not modified, using parse cache (%r)", self.url)
+            self.dmm.add_to_menus(menus)
+            return
 
+        text = response.text
+        text_hash = None
 
-class ParserThreadList(UserList):
-    """Custom list to store parser threads."""
+        if self.parse_cache is not None:
+            text_hash = self.parse_cache.hash_text(text)
+            menus = self.parse_cache.get(self.url, text_hash)
+            if menus is not None:
+                logger.info("URL not changed, using parse cache (%r)", self.url)
+                self.dmm.add_to_menus(menus)
+                self.save_validators(response)
+                return
 
-    def append(self, something: ParserThread):
-        if not isinstance(something, ParserThread):
-            raise TypeError(
-                "ParserThreadList can only contain ParserThread instances, not %r"
-                % type(ParserThread).__name__,
-            )
+        if self.process_executor is None:
+            menus = parse_menus(text, self.url)
+        else:
+            menus = self.process_executor.submit(parse_menus, text, self.url).result()
 
-        super(ParserThreadList, self).append(something)
+        if self.parse_cache is not None:
+            self.parse_cache.set(self.url, text_hash, menus)
+            self.save_validators(response)
+
+        self.dmm.add_to_menus(menus)
+
+    def save_validators(self, response):
+        """Stores the validators of the response, so the next download of
+        the url is conditional.
+
+        Args:
+            response (requests.Response): response of the server.
+        """
+        if self.conditional:
+            self.http_cache.set(self.url, *downloader.get_validators(response))
+
+
+class ParserJobGroup:
+    """Group of the parser jobs of one run. Its futures are released when
+    the group is joined, so finished jobs (and their DMMs) are not kept alive.
+
+    It can be used as a context manager, which joins the group at exit.
+
+    Args:
+        executor (concurrent.futures.Executor): executor that runs the jobs.
+        process_executor (concurrent.futures.ProcessPoolExecutor, optional):
+            executor that parses the texts. Defaults to None (texts are parsed
+            by the jobs themselves).
+        parse_cache (ParseCache, optional): cache of the menus already parsed.
+            Defaults to None (no cache).
+        http_cache (HttpCache, optional): validators of the urls, used to make
+            conditional requests. Defaults to None (no conditional requests).
+    """
+
+    def __init__(
+        self, executor, process_executor=None, parse_cache=None, http_cache=None
+    ):
+        self.executor = executor
+        self.process_executor = process_executor
+        self.parse_cache = parse_cache
+        self.http_cache = http_cache
+        self._futures = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.join()
+
+    def __len__(self):
+        return len(self._futures)
+
+    def parse(self, url, dmm):
+        """Starts the parsing of the url.
+
+        Args:
+            url (str): url to get the menus from.
+            dmm (DailyMenusManager): DMM instance.
+
+        Returns:
+            concurrent.futures.Future: future of the job.
+        """
+        job = ParserJob(
+            url, dmm, self.process_executor, self.parse_cache, self.http_cache
+        )
+        future = self.executor.submit(job.run)
+        self._futures.append(future)
+        return future
+
+    def join(self):
+        """Waits for the jobs of the group to finish and releases them.
+
+        Returns:
+            list of concurrent.futures.Future: futures of the jobs.
+        """
+        futures, self._futures = self._futures, []
+        wait(futures)
+        logger.debug("Jobs finished (%d)", len(futures))
+        return futures
 
 
 class Parsers:
-    """Parsers manager class."""
+    """Parsers manager class.
+
+    Urls are processed by a pool of worker threads, whose size is set by the
+    config `PARSER_WORKERS`, so the number of simultaneous downloads is bounded.
+    Each run creates its own `ParserJobGroup` with `Parsers.group`.
+
+    If the config `PARSER_PROCESSES` is greater than 0, the texts are parsed
+    (CPU-bound work) by a pool of that many processes.
+
+    If the config `PARSE_CACHE` is enabled, the menus parsed from each url are
+    stored in the database (`ParseCache`), and pages whose text hasn't
+    changed are not parsed again. Besides, if `CONDITIONAL_REQUESTS` is enabled,
+    pages are downloaded with conditional requests (`HttpCache`), so pages
+    that haven't changed are not even downloaded.
+    """
 
     parsers = [HtmlParser, ManualParser]
-    _threads = ParserThreadList()
+    _executor = None
+    _process_executor = None
     _lock = Lock()
 
     @staticmethod
-    def _append(thread: ParserThread):
-        """Appends a thread to the list of threads.
+    def get_executor():
+        """Returns the pool of worker threads, creating it if needed.
 
-        Args:
-            thread (ParserThread): thread to append.
+        Returns:
+            concurrent.futures.ThreadPoolExecutor: pool of worker threads.
         """
         with Parsers._lock:
-            Parsers._threads.append(thread)
+            if Parsers._executor is None:
+                Parsers._executor = ThreadPoolExecutor(
+                    max_workers=current_app.config["PARSER_WORKERS"],
+                    thread_name_prefix="Parser",
+                )
+            return Parsers._executor
 
     @staticmethod
-    def parse(url, dmm):
-        """Starts the parsing of the url.
+    def get_process_executor():
+        """Returns the pool of worker processes, creating it if needed.
 
-        Args:
-            url (str): url to get the menus from.
-            dmm (DailyMenusManager): DMM instance.
+        Returns:
+            concurrent.futures.ProcessPoolExecutor or None: pool of worker
+                processes, or None if `PARSER_PROCESSES` is 0.
         """
-        worker = ParserThread(url, dmm)
-        worker.start()
-        Parsers._append(worker)
+        processes = current_app.config["PARSER_PROCESSES"]
+        if not processes:
+            return None
+
+        with Parsers._lock:
+            if Parsers._process_executor is None:
+                Parsers._process_executor = ProcessPoolExecutor(max_workers=processes)
+            return Parsers._process_executor
 
     @staticmethod
-    def join():
-        """Waits for all parser threads to finish."""
-        for worker in Parsers._threads:
-            worker.join()
+    def group():
+        """Returns a new group of parser jobs, which uses the pools of
+        worker threads and processes, and the parse cache.
+
+        Returns:
+            ParserJobGroup: new group of parser jobs.
+        """
+        database_path = current_app.config["DATABASE_PATH"]
+
+        parse_cache = None
+        if current_app.config["PARSE_CACHE"]:
+            parse_cache = ParseCache(database_path)
+
+        http_cache = None
+        if current_app.config["CONDITIONAL_REQUESTS"]:
+            http_cache = HttpCache(database_path)
 
-        logger.debug("Threads finished")
+        return ParserJobGroup(
+            Parsers.get_executor(),
+            Parsers.get_process_executor(),
+            parse_cache,
+            http_cache,
+        )
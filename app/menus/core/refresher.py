@@ -0,0 +1,111 @@
+"""Background refresher of the menus database."""
+import logging
+from threading import Event, Lock, Thread
+
+from flask import current_app
+
+from app.utils import now
+
+logger = logging.getLogger(__name__)
+
+
+class Refresher:
+    """Updates the menus database in a background thread, periodically and
+    on demand, so requests never wait for the menus web server.
+
+    The updates are still authorized by `UpdateControl`.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.interval = None
+        self.last_refresh = None
+        self._thread = None
+        self._requested = Event()
+        self._stopping = Event()
+        self._lock = Lock()
+
+    @property
+    def is_running(self):
+        """Returns whether the background thread is running."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, flask_app):
+        """Starts the background thread, if it isn't running yet.
+
+        Args:
+            flask_app (flask.Flask): application used to create the app context
+                of the updates.
+        """
+        with self._lock:
+            if self.is_running:
+                return
+
+            self.app = flask_app
+            self.interval = flask_app.config["REFRESH_INTERVAL"]
+            self._stopping.clear()
+            self._thread = Thread(target=self._run, name="Refresher", daemon=True)
+            self._thread.start()
+
+        logger.info("Refresher started (interval=%ss)", self.interval)
+
+    def stop(self):
+        """Stops the background thread, waiting for the current update
+        to finish."""
+        with self._lock:
+            thread = self._thread
+            self._stopping.set()
+            self._requested.set()
+
+        if thread is not None:
+            thread.join()
+
+        logger.info("Refresher stopped")
+
+    def request_update(self):
+        """Asks the background thread to update the database as soon as
+        possible. It returns immediately."""
+        if not self.is_running:
+            self.start(current_app._get_current_object())
+
+        logger.debug("Update requested")
+        self._requested.set()
+
+    def _run(self):
+        from app.menus.core.daily_menus_manager import DailyMenusManager
+
+        while True:
+            requested = self._requested.wait(timeout=self.interval)
+            self._requested.clear()
+
+            if self._stopping.is_set():
+                return
+
+            reason = "requested" if requested else "scheduled"
+            logger.info("Refreshing menus (%s)", reason)
+
+            with self.app.app_context():
+                try:
+                    DailyMenusManager.load(force=True, background=False)
+                except Exception:
+                    logger.exception("Error refreshing menus")
+
+            self.last_refresh = now()
+
+
+refresher = Refresher()
+
+
+def init_app(flask_app):
+    """Starts the refresher with the first request, if `BACKGROUND_REFRESH`
+    is enabled.
+
+    Args:
+        flask_app (flask.Flask): application.
+    """
+    if not flask_app.config["BACKGROUND_REFRESH"]:
+        return
+
+    @flask_app.before_first_request
+    def start_refresher():
+        refresher.start(flask_app)
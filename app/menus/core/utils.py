@@ -1,12 +1,12 @@
 """Utils for menus' core."""
 import logging
 import re
-from itertools import count
 from typing import List, Union
 
 from bs4 import BeautifulSoup as Soup
 from flask import current_app
 
+from app.menus.models import HttpCache
 from app.utils.exceptions import DownloaderError
 from app.utils.networking import downloader
 
@@ -23,8 +23,25 @@ class _Cache:
     redirect_url = None
 
 
-def get_menus_urls(request_all=False):
-    """Returns the url to retrieve menus from."""
+def get_menus_urls(request_all=False, on_url=None):
+    """Returns the url to retrieve menus from.
+
+    If `request_all` is True, every page of the blog is crawled concurrently
+    (see `Crawler`). Otherwise, only the first page is downloaded.
+
+    If `CONDITIONAL_REQUESTS` is enabled, the blog pages are downloaded with
+    conditional requests, and the urls of the pages that haven't changed are
+    taken from the database (`HttpCache`).
+
+    Args:
+        request_all (bool, optional): if True, crawl every page of the blog.
+            Defaults to False.
+        on_url (callable, optional): called with each url found, as soon as it
+            is found. Defaults to None.
+
+    Returns:
+        list of str: menus urls, from newest to oldest.
+    """
 
     if current_app.config["OFFLINE"]:
         logger.info("Server set to offline, returning emtpy list as menus urls")
@@ -32,34 +49,68 @@ def get_menus_urls(request_all=False):
 
     logger.debug("Getting menus urls")
 
-    url = TEMPLATE % 0  # To avoid possible runtime errors
-    urls = []
+    if request_all:
+        from app.menus.core.crawler import crawl_menus_urls
 
-    for index in count(1):
-        try:
-            url = TEMPLATE % index
-            response = downloader.get(url)
-            if "¡Esto es un blog!" in response.text:
-                break
+        return crawl_menus_urls(on_url)
 
-            soup = Soup(response.text, "html.parser")
-            container = soup.findAll("div", {"class": "j-blog-meta"})
-            urls += [x.a["href"] for x in container]
+    http_cache = None
+    if current_app.config["CONDITIONAL_REQUESTS"]:
+        http_cache = HttpCache(current_app.config["DATABASE_PATH"])
 
-            if not request_all:
-                return urls
+    url = TEMPLATE % 1
 
-        except DownloaderError:
-            logger.warning("Could not retrieve url %r", url)
+    try:
+        urls = _get_page_urls(url, http_cache) or []
+    except DownloaderError:
+        logger.warning("Could not retrieve url %r", url)
+        return []
 
-            # If there is an error in the first try and only the first one needs to
-            # be processed, then return nothing (urls = [])
-            if not request_all:
-                return urls
+    if on_url is not None:
+        for url in urls:
+            on_url(url)
 
     return urls
 
 
+def _get_page_urls(url, http_cache=None):
+    """Returns the menus urls listed in a page of the blog.
+
+    Args:
+        url (str): url of the page of the blog.
+        http_cache (HttpCache, optional): if set, the page is downloaded with a
+            conditional request. Defaults to None.
+
+    Returns:
+        list of str or None: urls listed in the page, or None if the page is
+            past the last page of the blog.
+
+    Raises:
+        DownloaderError: if the page can't be downloaded.
+    """
+    entry = http_cache.get(url) if http_cache else None
+
+    if entry is None:
+        response = downloader.get(url)
+    else:
+        response = downloader.conditional_get(url, entry.etag, entry.last_modified)
+        if response.status_code == 304:
+            logger.debug("Page not modified (%r)", url)
+            return entry.data
+
+    if "¡Esto es un blog!" in response.text:
+        page_urls = None
+    else:
+        soup = Soup(response.text, "html.parser")
+        container = soup.findAll("div", {"class": "j-blog-meta"})
+        page_urls = [x.a["href"] for x in container]
+
+    if http_cache is not None:
+        http_cache.set(url, *downloader.get_validators(response), data=page_urls)
+
+    return page_urls
+
+
 def get_last_menus_url():
     """Returns the most recent menus url, using the cache, the DMM and
     finally, the main web.
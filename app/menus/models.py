@@ -1,7 +1,14 @@
 """Database models for application."""
+import atexit
+import json
 import logging
+import os
 import sqlite3
+from collections import namedtuple
 from datetime import datetime, timedelta
+from hashlib import sha1
+from queue import Empty, Full, LifoQueue
+from threading import Lock
 
 from flask import current_app
 
@@ -9,22 +16,163 @@ from app.utils import now
 
 logger = logging.getLogger(__name__)
 
+BulkSaveResult = namedtuple("BulkSaveResult", ["inserted", "skipped"])
+HttpCacheEntry = namedtuple("HttpCacheEntry", ["etag", "last_modified", "data"])
+
+
+class _MenusCache:
+    """Static class to store the menus loaded from each database, so they
+    are not read from the database on every request.
+
+    Each entry is stored with a key (the data version) made of the number of
+    writes made by this process, the database's modification time and
+    today's date, so it expires if the database is changed (even by other
+    processes) or when the day changes (menus store whether they are today's
+    menu).
+    """
+
+    _entries = {}
+    _writes = 0
+    _lock = Lock()
+
+    @staticmethod
+    def get_key(database_path):
+        """Returns the key that the entry of the database must match.
+
+        Args:
+            database_path (str or pathlib.Path): path of the database.
+
+        Returns:
+            tuple or None: key of the database, or None if the database
+                doesn't exist yet.
+        """
+        try:
+            mtime = os.stat(database_path).st_mtime_ns
+        except OSError:
+            return None
+
+        return _MenusCache._writes, mtime, now().date()
+
+    @staticmethod
+    def get(database_path, key):
+        """Returns the menus stored for the database, or None if there is
+        no entry or it has expired."""
+        if key is None:
+            return None
+
+        with _MenusCache._lock:
+            entry = _MenusCache._entries.get(database_path)
+
+        if entry is None or entry[0] != key:
+            return None
+        return entry[1]
+
+    @staticmethod
+    def set(database_path, key, menus):
+        """Stores the menus loaded from the database."""
+        if key is None:
+            return
+
+        with _MenusCache._lock:
+            _MenusCache._entries[database_path] = (key, tuple(menus))
+
+    @staticmethod
+    def invalidate(database_path=None):
+        """Removes the entry of the database (or every entry if
+        database_path is None)."""
+        with _MenusCache._lock:
+            _MenusCache._writes += 1
+            if database_path is None:
+                _MenusCache._entries.clear()
+            else:
+                _MenusCache._entries.pop(database_path, None)
+
 
 class DailyMenusDatabaseController:
     """Interface to list, save and remove menus using a sqlite database."""
 
+    @staticmethod
+    def get_data_version():
+        """Returns the version of the data stored in the database. It changes
+        every time the database is written, and also when the day changes.
+        It doesn't query the database.
+
+        Returns:
+            tuple or None: data version, or None if the database doesn't exist yet.
+        """
+        return _MenusCache.get_key(current_app.config["DATABASE_PATH"])
+
     @staticmethod
     def list_menus():
-        """Returns a list with menus stored in the database.
+        """Returns a list with menus stored in the database, sorted by date
+        (most recent first).
+
+        Notes:
+            The menus are cached in memory until the database changes, so the
+            returned menus must not be modified.
+
+        Returns:
+            list of DailyMenu: menus stored in the database.
+        """
+        from app.menus.core.structure import DailyMenu, Meal
+
+        database_path = current_app.config["DATABASE_PATH"]
+        key = _MenusCache.get_key(database_path)
+        menus = _MenusCache.get(database_path, key)
+
+        if menus is not None:
+            return list(menus)
+
+        with DatabaseConnection() as connection:
+            connection.execute(
+                "SELECT day, month, year, lunch1, lunch2, dinner1, dinner2, url "
+                "FROM 'daily_menus' ORDER BY id DESC"
+            )
+
+            menus = [
+                DailyMenu(
+                    data[0],
+                    data[1],
+                    data[2],
+                    Meal(*data[3:5]),
+                    Meal(*data[5:7]),
+                    data[7],
+                )
+                for data in connection.fetch_all()
+            ]
+
+        _MenusCache.set(database_path, key, menus)
+        return menus
+
+    @staticmethod
+    def list_menus_between(first_id=None, last_id=None, limit=None):
+        """Returns the menus whose id is between `first_id` and `last_id` (both
+        included), sorted by date (most recent first). The ids are the dates
+        of the menus formatted as integers (YYYYMMDD).
+
+        Args:
+            first_id (int, optional): lowest id. Defaults to None (no limit).
+            last_id (int, optional): highest id. Defaults to None (no limit).
+            limit (int, optional): maximum number of menus returned.
+                Defaults to None (no limit).
 
         Returns:
             list of DailyMenu: menus stored in the database.
         """
         from app.menus.core.structure import DailyMenu, Meal
 
+        if first_id is None:
+            first_id = 0
+        if last_id is None:
+            last_id = 99991231
+        if limit is None:
+            limit = -1
+
         with DatabaseConnection() as connection:
             connection.execute(
-                "SELECT day, month, year, lunch1, lunch2, dinner1, dinner2, url FROM 'daily_menus'"
+                "SELECT day, month, year, lunch1, lunch2, dinner1, dinner2, url "
+                "FROM 'daily_menus' WHERE id BETWEEN ? AND ? ORDER BY id DESC LIMIT ?",
+                (first_id, last_id, limit),
             )
 
             return [
@@ -67,10 +215,54 @@ class DailyMenusDatabaseController:
                     "INSERT INTO 'daily_menus' VALUES (?,?,?,?,?,?,?,?,?)", data
                 )
                 connection.commit()
+                _MenusCache.invalidate(connection.database_path)
                 return True
             except sqlite3.IntegrityError:
                 return False
 
+    @classmethod
+    def save_daily_menus(cls, daily_menus):
+        """Saves multiple menus in the database, using just one transaction.
+        Menus already stored in the database are skipped.
+
+        Args:
+            daily_menus (list of DailyMenu): menus to save.
+
+        Returns:
+            BulkSaveResult: number of menus inserted and skipped.
+        """
+        data = [
+            (
+                daily_menu.id,
+                daily_menu.day,
+                daily_menu.month,
+                daily_menu.year,
+                daily_menu.lunch.p1,
+                daily_menu.lunch.p2,
+                daily_menu.dinner.p1,
+                daily_menu.dinner.p2,
+                daily_menu.url,
+            )
+            for daily_menu in daily_menus
+        ]
+
+        if not data:
+            return BulkSaveResult(0, 0)
+
+        with DatabaseConnection() as connection:
+            connection.executemany(
+                "INSERT INTO 'daily_menus' VALUES (?,?,?,?,?,?,?,?,?) "
+                "ON CONFLICT(id) DO NOTHING",
+                data,
+            )
+            inserted = connection.cursor.rowcount
+            connection.commit()
+
+            if inserted:
+                _MenusCache.invalidate(connection.database_path)
+
+        return BulkSaveResult(inserted, len(data) - inserted)
+
     @classmethod
     def remove_daily_menu(cls, daily_menu):
         """Removes a menu from the database.
@@ -92,22 +284,170 @@ class DailyMenusDatabaseController:
 
             connection.execute("DELETE FROM 'daily_menus' WHERE id=?", [daily_menu.id])
             connection.commit()
+            _MenusCache.invalidate(connection.database_path)
             return True
 
 
-class DatabaseConnection:
-    """Interface for raw database connections."""
-
-    def __init__(self):
+SCHEMA = (
+    """
+        CREATE TABLE IF NOT EXISTS 'daily_menus' (
+        'id'	INTEGER NOT NULL PRIMARY KEY,
+        'day'	INTEGER NOT NULL,
+        'month'	INTEGER NOT NULL,
+        'year'	INTEGER NOT NULL,
+        'lunch1'	VARCHAR ( 200 ),
+        'lunch2'	VARCHAR ( 200 ),
+        'dinner1'	VARCHAR ( 200 ),
+        'dinner2'	VARCHAR ( 200 ),
+        'url'       VARCHAR (300)
+    );
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS 'update_control' (
+        'datetime' VARCHAR (200) NOT NULL
+    );
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS 'parse_cache' (
+        'url'       VARCHAR (300) NOT NULL PRIMARY KEY,
+        'hash'      VARCHAR (40) NOT NULL,
+        'menus'     TEXT NOT NULL
+    );
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS 'http_cache' (
+        'url'           VARCHAR (300) NOT NULL PRIMARY KEY,
+        'etag'          VARCHAR (200),
+        'last_modified' VARCHAR (200),
+        'data'          TEXT
+    );
+    """,
+)
+
+
+class ConnectionPool:
+    """Thread-safe pool of sqlite connections, grouped by database path.
+
+    Connections are borrowed with `acquire` and given back with `release`. If
+    there is no idle connection a new one is opened, and if the pool is full
+    when a connection is released, it is closed instead of stored, so the
+    number of idle connections is bounded by `size`.
+
+    The schema is created only the first time a database is opened by the pool.
+
+    Args:
+        size (int, optional): maximum number of idle connections kept for each
+            database. Defaults to 5.
+    """
+
+    def __init__(self, size=5):
+        self.size = size
+        self._queues = {}
+        self._initialized = set()
+        self._lock = Lock()
+        self._schema_lock = Lock()
+
+    def _get_queue(self, database_path):
+        with self._lock:
+            if database_path not in self._queues:
+                self._queues[database_path] = LifoQueue(maxsize=self.size)
+            return self._queues[database_path]
+
+    def _connect(self, database_path):
         try:
-            self.connection = sqlite3.connect(current_app.config["DATABASE_PATH"])
+            connection = sqlite3.connect(database_path, check_same_thread=False)
         except TypeError:
-            self.connection = sqlite3.connect(
-                current_app.config["DATABASE_PATH"].as_posix()
+            connection = sqlite3.connect(
+                database_path.as_posix(), check_same_thread=False
             )
 
+        # Other threads must wait until the schema is created
+        with self._schema_lock:
+            if database_path not in self._initialized:
+                logger.debug("Ensuring database schema (%s)", database_path)
+                cursor = connection.cursor()
+                for script in SCHEMA:
+                    cursor.execute(script)
+                connection.commit()
+                cursor.close()
+                self._initialized.add(database_path)
+
+        return connection
+
+    def acquire(self, database_path):
+        """Returns an idle connection to the database, opening a new one
+        if there isn't any.
+
+        Args:
+            database_path (str or pathlib.Path): path of the database.
+
+        Returns:
+            sqlite3.Connection: connection to the database.
+        """
+        try:
+            return self._get_queue(database_path).get_nowait()
+        except Empty:
+            return self._connect(database_path)
+
+    def release(self, database_path, connection):
+        """Gives a connection back to the pool. Uncommitted changes are
+        rolled back.
+
+        Args:
+            database_path (str or pathlib.Path): path of the database.
+            connection (sqlite3.Connection): connection to release.
+        """
+        if connection.in_transaction:
+            connection.rollback()
+
+        try:
+            self._get_queue(database_path).put_nowait(connection)
+        except Full:
+            connection.close()
+
+    def close_all(self):
+        """Closes every idle connection and forgets the initialized databases,
+        so the schema is ensured again the next time they are opened.
+        """
+        with self._lock:
+            queues = list(self._queues.values())
+            self._queues = {}
+            self._initialized = set()
+
+        for queue in queues:
+            while True:
+                try:
+                    queue.get_nowait().close()
+                except Empty:
+                    break
+
+
+connection_pool = ConnectionPool()
+atexit.register(connection_pool.close_all)
+
+
+def init_app(flask_app):
+    """Binds the connection pool to the application's lifecycle.
+
+    Args:
+        flask_app (flask.Flask): application.
+    """
+    connection_pool.size = flask_app.config.get("DATABASE_POOL_SIZE", 5)
+
+
+class DatabaseConnection:
+    """Interface for raw database connections, borrowed from the
+    connection pool.
+
+    Args:
+        database_path (str or pathlib.Path, optional): path of the database.
+            Defaults to None (the app's `DATABASE_PATH`).
+    """
+
+    def __init__(self, database_path=None):
+        self.database_path = database_path or current_app.config["DATABASE_PATH"]
+        self.connection = connection_pool.acquire(self.database_path)
         self.cursor = self.connection.cursor()
-        self.ensure_tables()
 
     def __enter__(self):
         return self
@@ -116,9 +456,9 @@ class DatabaseConnection:
         self.close()
 
     def close(self):
-        """Closes the database connection."""
+        """Gives the database connection back to the pool."""
         self.cursor.close()
-        self.connection.close()
+        connection_pool.release(self.database_path, self.connection)
 
     def commit(self):
         """Saves changes to the database."""
@@ -128,38 +468,177 @@ class DatabaseConnection:
         """Executes a SQL order."""
         return self.cursor.execute(*args, **kwargs)
 
+    def executemany(self, *args, **kwargs):
+        """Executes a SQL order for each set of parameters."""
+        return self.cursor.executemany(*args, **kwargs)
+
     def fetch_all(self):
         """Returns all the data stored in the database."""
         return self.cursor.fetchall()
 
     def ensure_tables(self):
         """Executes a SQL script to ensure the existance of the sqlite table."""
-        self.execute(
-            """
-                CREATE TABLE IF NOT EXISTS 'daily_menus' (
-                'id'	INTEGER NOT NULL PRIMARY KEY,
-                'day'	INTEGER NOT NULL,
-                'month'	INTEGER NOT NULL,
-                'year'	INTEGER NOT NULL,
-                'lunch1'	VARCHAR ( 200 ),
-                'lunch2'	VARCHAR ( 200 ),
-                'dinner1'	VARCHAR ( 200 ),
-                'dinner2'	VARCHAR ( 200 ),
-                'url'       VARCHAR (300)
-            );
-            """
-        )
-
-        self.execute(
-            """
-                CREATE TABLE IF NOT EXISTS 'update_control' (
-                'datetime' VARCHAR (200) NOT NULL
-            );
-            """
-        )
+        for script in SCHEMA:
+            self.execute(script)
         self.commit()
 
 
+class ParseCache:
+    """Persistent cache of the menus parsed from each url. The entry of an url
+    is only valid while the hash of its text doesn't change, so pages already
+    parsed are not parsed again.
+
+    It doesn't need an app context, so it can be used by the parser workers.
+
+    Args:
+        database_path (str or pathlib.Path): path of the database.
+    """
+
+    def __init__(self, database_path):
+        self.database_path = database_path
+
+    @staticmethod
+    def hash_text(text):
+        """Returns the hash of the text of a page.
+
+        Args:
+            text (str): text of the page.
+
+        Returns:
+            str: hash of the text.
+        """
+        return sha1(text.encode("utf-8")).hexdigest()
+
+    def get(self, url, text_hash=None):
+        """Returns the menus parsed from the url, if its text hasn't changed.
+
+        Args:
+            url (str): url of the page.
+            text_hash (str, optional): hash of the current text of the page.
+                Defaults to None (the page is known to be unchanged, so the
+                last menus parsed from the url are returned).
+
+        Returns:
+            list of DailyMenu or None: menus parsed from the url, or None if
+                the url is not cached or its text has changed.
+        """
+        from app.menus.core.structure import DailyMenu, Meal
+
+        with DatabaseConnection(self.database_path) as connection:
+            if text_hash is None:
+                connection.execute(
+                    "SELECT menus FROM 'parse_cache' WHERE url=?", (url,)
+                )
+            else:
+                connection.execute(
+                    "SELECT menus FROM 'parse_cache' WHERE url=? AND hash=?",
+                    (url, text_hash),
+                )
+            result = connection.fetch_all()
+
+        if not result:
+            return None
+
+        menus = []
+        for record in json.loads(result[0][0]):
+            # Plates are restored as they were parsed (Meal lowercases them)
+            lunch, dinner = Meal(), Meal()
+            lunch.p1, lunch.p2, dinner.p1, dinner.p2 = record[3:7]
+            menus.append(DailyMenu(*record[:3], lunch, dinner, url))
+
+        return menus
+
+    def set(self, url, text_hash, menus):
+        """Stores the menus parsed from the url, replacing the previous entry.
+
+        Args:
+            url (str): url of the page.
+            text_hash (str): hash of the text of the page.
+            menus (list of DailyMenu): menus parsed from the url.
+        """
+        records = [
+            (
+                menu.day,
+                menu.month,
+                menu.year,
+                menu.lunch.p1,
+                menu.lunch.p2,
+                menu.dinner.p1,
+                menu.dinner.p2,
+            )
+            for menu in menus
+        ]
+
+        with DatabaseConnection(self.database_path) as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO 'parse_cache' VALUES (?,?,?)",
+                (url, text_hash, json.dumps(records)),
+            )
+            connection.commit()
+
+
+class HttpCache:
+    """Persistent store of the validators (`ETag` and `Last-Modified`) sent by
+    the server for each url, so the next request can be conditional. Along
+    with the validators, each entry can store data derived from the page (as
+    json), to be reused when the server answers `304 Not Modified`.
+
+    It doesn't need an app context, so it can be used by the parser workers.
+
+    Args:
+        database_path (str or pathlib.Path): path of the database.
+    """
+
+    def __init__(self, database_path):
+        self.database_path = database_path
+
+    def get(self, url):
+        """Returns the entry of the url.
+
+        Args:
+            url (str): url of the page.
+
+        Returns:
+            HttpCacheEntry or None: validators and data of the url, or None if
+                the url is not stored.
+        """
+        with DatabaseConnection(self.database_path) as connection:
+            connection.execute(
+                "SELECT etag, last_modified, data FROM 'http_cache' WHERE url=?",
+                (url,),
+            )
+            result = connection.fetch_all()
+
+        if not result:
+            return None
+
+        etag, last_modified, data = result[0]
+        if data is not None:
+            data = json.loads(data)
+        return HttpCacheEntry(etag, last_modified, data)
+
+    def set(self, url, etag, last_modified, data=None):
+        """Stores the entry of the url, replacing the previous one. If the
+        server didn't send any validator, the entry is removed.
+
+        Args:
+            url (str): url of the page.
+            etag (str): `ETag` header sent by the server.
+            last_modified (str): `Last-Modified` header sent by the server.
+            data (optional): json-serializable data derived from the page.
+                Defaults to None.
+        """
+        with DatabaseConnection(self.database_path) as connection:
+            if etag is None and last_modified is None:
+                connection.execute("DELETE FROM 'http_cache' WHERE url=?", (url,))
+            else:
+                connection.execute(
+                    "INSERT OR REPLACE INTO 'http_cache' VALUES (?,?,?,?)",
+                    (url, etag, last_modified, json.dumps(data)),
+                )
+            connection.commit()
+
+
 class UpdateControl:
     """Manager class that decides when is the database can be updated."""
 
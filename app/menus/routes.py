@@ -2,16 +2,75 @@
 import json
 from collections import namedtuple
 from datetime import datetime
+from hashlib import sha1
+from threading import Lock
 
-from flask import redirect, render_template, request, url_for
+from flask import make_response, redirect, render_template, request, url_for
 from flask.helpers import flash
 
 from app.menus.core.utils import PRINCIPAL_URL, get_last_menus_url
-from app.utils import Tokens, get_post_arg
+from app.utils import Tokens, get_post_arg, now
 
 from . import menus_blueprint
 from .core.daily_menus_manager import DailyMenusManager
 from .core.structure import DailyMenu, Meal
+from .models import DailyMenusDatabaseController
+
+MenusPayload = namedtuple(
+    "MenusPayload", ["data", "etag", "last_modified", "version", "has_today"]
+)
+
+
+class _PayloadCache:
+    """Static class to store the last json payload served by /api/menus,
+    so it is not serialized again until the data version changes."""
+
+    payload = None
+    lock = Lock()
+
+
+def get_menus_payload(force=False):
+    """Returns the json payload of all the menus, serializing it only if the
+    data has changed since the last time.
+
+    The cached payload is not used if it doesn't contain today's menu, because
+    in that case `DailyMenusManager.load` may update the database.
+
+    Args:
+        force (bool, optional): force the update of the menus, skipping the
+            cache. Defaults to False.
+
+    Returns:
+        MenusPayload: serialized menus with its validators.
+    """
+    version = DailyMenusDatabaseController.get_data_version()
+
+    with _PayloadCache.lock:
+        payload = _PayloadCache.payload
+
+    if (
+        not force
+        and payload is not None
+        and version is not None
+        and payload.version == version
+        and payload.has_today
+    ):
+        return payload
+
+    dmm = DailyMenusManager.load(force=force)
+    data = json.dumps(dmm.to_json()).encode("utf-8")
+    payload = MenusPayload(
+        data=data,
+        etag=sha1(data).hexdigest(),
+        last_modified=now().replace(microsecond=0),
+        version=version,
+        has_today=now().date() in dmm,
+    )
+
+    with _PayloadCache.lock:
+        _PayloadCache.payload = payload
+
+    return payload
 
 
 @menus_blueprint.route("/menus")
@@ -53,9 +112,7 @@ def menus_update():
     After update, the user is redirected to /menus.
     """
     dmm = DailyMenusManager.load(force=True)
-
-    for menu in dmm:
-        menu.to_database()
+    dmm.save_to_database()
 
     return redirect(url_for("menus_blueprint.menus_view", _external=True))
 
@@ -81,7 +138,9 @@ def today_view():
     data = json.dumps(dmm.to_json())
 
     if dmm.today_not_in_self or update:
-        if dmm.updated:
+        if dmm.refreshing:
+            flash("Actualizando base de datos", "info")
+        elif dmm.updated:
             flash("Base de datos actualizada", "success")
         else:
             flash("Permiso denegado", "danger")
@@ -123,13 +182,108 @@ def add_menu_api():
     return repr(menu)
 
 
+def _get_date_id_arg(name):
+    """Gets a date (YYYY-MM-DD) from the url args and returns it as a menu id.
+
+    Raises:
+        ValueError: if the date is not valid.
+
+    Returns:
+        int or None: id of the date, or None if the arg is not present.
+    """
+    arg = request.args.get(name)
+    if not arg:
+        return None
+
+    try:
+        date = datetime.strptime(arg.strip(), "%Y-%m-%d")
+    except ValueError:
+        raise ValueError("%r must be a date (YYYY-MM-DD), not %r" % (name, arg))
+
+    return int(date.strftime("%Y%m%d"))
+
+
+def _get_positive_int_arg(name):
+    """Gets a positive integer from the url args.
+
+    Raises:
+        ValueError: if the arg is not a positive integer.
+
+    Returns:
+        int or None: value of the arg, or None if the arg is not present.
+    """
+    arg = request.args.get(name)
+    if not arg:
+        return None
+
+    try:
+        value = int(arg)
+    except ValueError:
+        value = 0
+
+    if value <= 0:
+        raise ValueError("%r must be a positive integer, not %r" % (name, arg))
+
+    return value
+
+
+def _api_menus_page():
+    """Returns the menus selected by the args `from`, `to`, `limit` and
+    `cursor` as json.
+
+    If there are more menus, the id that must be passed as `cursor` to get the
+    next page is sent in the `X-Next-Cursor` header.
+    """
+    try:
+        first_id = _get_date_id_arg("from")
+        last_id = _get_date_id_arg("to")
+        limit = _get_positive_int_arg("limit")
+        cursor = _get_positive_int_arg("cursor")
+    except ValueError as err:
+        return "ValueError: %s" % err.args[0], 400
+
+    if cursor is not None:
+        last_id = cursor - 1 if last_id is None else min(last_id, cursor - 1)
+
+    # One more menu is requested to know if there is a next page
+    menus = DailyMenusDatabaseController.list_menus_between(
+        first_id, last_id, limit + 1 if limit else None
+    )
+
+    next_cursor = None
+    if limit and len(menus) > limit:
+        menus = menus[:limit]
+        next_cursor = menus[-1].id
+
+    dmm = DailyMenusManager()
+    dmm.add_to_menus(menus)
+
+    response = make_response(json.dumps(dmm.to_json()), 200)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+    return response
+
+
 @menus_blueprint.route("/api/menus")
 def api_menus():
-    """API endpoint that returns all the menus as json."""
+    """API endpoint that returns all the menus as json.
+
+    The response includes an `ETag` and a `Last-Modified` header, so clients
+    can make conditional requests (answered with 304 if nothing changed).
+
+    The args `from`, `to`, `limit` and `cursor` return only a range of the
+    menus (see `_api_menus_page`).
+    """
+    if any(x in request.args for x in ("from", "to", "limit", "cursor")):
+        return _api_menus_page()
+
     force = request.args.get("force") is not None or request.args.get("f") is not None
-    dmm = DailyMenusManager.load(force=force)
-    data = dmm.to_json()
-    return json.dumps(data), 200
+    payload = get_menus_payload(force=force)
+
+    response = make_response(payload.data, 200)
+    response.set_etag(payload.etag)
+    response.last_modified = payload.last_modified
+    return response.make_conditional(request)
 
 
 @menus_blueprint.route("/add", methods=["GET", "POST"])
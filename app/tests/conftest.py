@@ -5,6 +5,7 @@ from flask.globals import current_app
 
 from app import create_app
 from app.config import TestingConfig
+from app.menus.models import connection_pool
 
 
 @pytest.fixture(scope="session", autouse=True)
@@ -32,5 +33,6 @@ def remove_testing_database():
     """Removes the testing database."""
     yield
 
+    connection_pool.close_all()
     if TestingConfig.DATABASE_PATH.is_file():
         TestingConfig.DATABASE_PATH.unlink()
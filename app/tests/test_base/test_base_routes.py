@@ -116,3 +116,10 @@ def test_footer(client, url):
     assert b"https://sralloza.es" in rv.data
     assert "¿Algún error? ¿Alguna sugerencia?".encode("utf-8") in rv.data
     assert "© 2018-2020 Diego Alloza González".encode("utf-8") in rv.data
+
+
+def test_status(client):
+    rv = client.get("/api/status")
+    assert rv.status_code == 200
+    assert rv.json["downloader"]["state"] == "closed"
+    assert set(rv.json["downloader"]) == {"state", "failures", "retry_in"}
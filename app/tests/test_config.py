@@ -25,6 +25,11 @@ class TestConfig:
         assert isinstance(Config.DATABASE_PATH, Path)
         assert "flask.db" in Config.DATABASE_PATH.as_posix()
 
+    def test_database_pool_size(self):
+        assert hasattr(Config, "DATABASE_POOL_SIZE")
+        assert isinstance(Config.DATABASE_POOL_SIZE, int)
+        assert Config.DATABASE_POOL_SIZE > 0
+
     def test_is_linux(self):
         assert hasattr(Config, "IS_LINUX")
         assert isinstance(Config.IS_LINUX, bool)
@@ -43,6 +48,52 @@ class TestConfig:
         assert hasattr(Config, "ADMIN_EMAIL")
         assert isinstance(Config.ADMIN_EMAIL, str)
 
+    def test_background_refresh(self):
+        assert hasattr(Config, "BACKGROUND_REFRESH")
+        assert isinstance(Config.BACKGROUND_REFRESH, bool)
+        assert Config.BACKGROUND_REFRESH is True
+
+    def test_parser_workers(self):
+        assert hasattr(Config, "PARSER_WORKERS")
+        assert isinstance(Config.PARSER_WORKERS, int)
+        assert Config.PARSER_WORKERS > 0
+
+    def test_parser_processes(self):
+        assert hasattr(Config, "PARSER_PROCESSES")
+        assert isinstance(Config.PARSER_PROCESSES, int)
+        assert Config.PARSER_PROCESSES >= 0
+
+    def test_parse_cache(self):
+        assert hasattr(Config, "PARSE_CACHE")
+        assert isinstance(Config.PARSE_CACHE, bool)
+
+    def test_conditional_requests(self):
+        assert hasattr(Config, "CONDITIONAL_REQUESTS")
+        assert isinstance(Config.CONDITIONAL_REQUESTS, bool)
+
+    def test_downloader(self):
+        assert isinstance(Config.DOWNLOADER_RETRIES, int)
+        assert Config.DOWNLOADER_RETRIES >= 0
+        assert Config.DOWNLOADER_CONNECT_TIMEOUT > 0
+        assert Config.DOWNLOADER_READ_TIMEOUT > 0
+        assert Config.DOWNLOADER_BACKOFF >= 0
+        assert Config.DOWNLOADER_BACKOFF_MAX >= Config.DOWNLOADER_BACKOFF
+        assert isinstance(Config.DOWNLOADER_POOL_CONNECTIONS, int)
+        assert Config.DOWNLOADER_POOL_CONNECTIONS > 0
+        assert isinstance(Config.DOWNLOADER_POOL_MAXSIZE, int)
+        assert Config.DOWNLOADER_POOL_MAXSIZE > 0
+
+    def test_circuit_breaker(self):
+        assert isinstance(Config.CIRCUIT_BREAKER_THRESHOLD, int)
+        assert Config.CIRCUIT_BREAKER_THRESHOLD > 0
+        assert isinstance(Config.CIRCUIT_BREAKER_COOLDOWN, int)
+        assert Config.CIRCUIT_BREAKER_COOLDOWN > 0
+
+    def test_refresh_interval(self):
+        assert hasattr(Config, "REFRESH_INTERVAL")
+        assert isinstance(Config.REFRESH_INTERVAL, int)
+        assert Config.REFRESH_INTERVAL > 0
+
 
 class TestTestingConfig:
     def test_inherintance(self):
@@ -53,6 +104,13 @@ class TestTestingConfig:
         assert isinstance(TestingConfig.TESTING, bool)
         assert TestingConfig.TESTING is True
 
+    def test_background_refresh(self):
+        assert hasattr(TestingConfig, "BACKGROUND_REFRESH")
+        assert TestingConfig.BACKGROUND_REFRESH is False
+
+    def test_downloader_backoff(self):
+        assert TestingConfig.DOWNLOADER_BACKOFF == 0
+
     def test_database_path(self):
         assert hasattr(TestingConfig, "DATABASE_PATH")
         assert isinstance(TestingConfig.DATABASE_PATH, Path)
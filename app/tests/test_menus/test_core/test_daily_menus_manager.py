@@ -1,14 +1,16 @@
 import random
+import time
 from datetime import date
+from threading import Event, Thread
 from unittest import mock
 
 import pytest
 
 from app.menus.core.daily_menus_manager import DailyMenusManager
-from app.menus.core.parser import Parsers
+from app.menus.core.parser import ParserJobGroup
 from app.menus.core.structure import DailyMenu, Meal
-from app.menus.models import UpdateControl
-from app.utils import now
+from app.menus.models import BulkSaveResult, UpdateControl
+from app.utils import FileLock, now
 
 
 @pytest.fixture
@@ -18,7 +20,7 @@ def dmm():
     dinner = Meal("dinner-1", "dinner-2")
     for e in range(1, 13):
         menu = DailyMenu(e, e, 2019, lunch, dinner)
-        dmm.menus.append(menu)
+        dmm.add_to_menus(menu)
 
     return dmm
 
@@ -26,6 +28,7 @@ def test_attributes(dmm):
     assert hasattr(dmm, "updated")
     assert hasattr(dmm, "today_not_in_self")
     assert hasattr(dmm, "menus")
+    assert hasattr(dmm, "_index")
     assert hasattr(dmm, "_lock")
 
 def test_contains(dmm):
@@ -228,6 +231,16 @@ class TestAddToMenus:
         assert date(2019, 11, 6) in dmm
         assert date(2019, 10, 6) in dmm
 
+    def test_add_duplicate_menus_same_call(self):
+        dmm = DailyMenusManager()
+
+        menu1 = DailyMenu(6, 12, 2019, Meal("lunch-1", "lunch-2"))
+        menu2 = DailyMenu(6, 12, 2019, Meal("other-1", "other-2"))
+
+        dmm.add_to_menus([menu1, menu2])
+        assert len(dmm) == 1
+        assert dmm[date(2019, 12, 6)] is menu1
+
 
 @pytest.fixture
 def load_mocks():
@@ -246,12 +259,19 @@ def load_mocks():
         spec_set=UpdateControl.should_update,
     ).start()
     parse_mock = mock.patch(
-        "app.menus.core.daily_menus_manager.Parsers.parse", spec_set=Parsers.parse
+        "app.menus.core.parser.ParserJobGroup.parse", spec_set=ParserJobGroup.parse
     ).start()
     gmu_mock = mock.patch(
         "app.menus.core.daily_menus_manager.get_menus_urls", autospec=True
     ).start()
-    gmu_mock.return_value = ["https://1.example.com", "https://2.example.com"]
+
+    def get_menus_urls(request_all, on_url):
+        urls = ["https://1.example.com", "https://2.example.com"]
+        for url in urls:
+            on_url(url)
+        return urls
+
+    gmu_mock.side_effect = get_menus_urls
     yield std_mock, contains_mock, lfd_mock, su_mock, parse_mock, gmu_mock
 
     mock.patch.stopall()
@@ -296,8 +316,13 @@ def test_load(load_mocks, force, tid, should_update, parse_all, client):
     # Mocks
     contains_mock.assert_called_once_with(now().date())
 
+    if tid and not force:
+        su_mock.assert_not_called()
+    else:
+        su_mock.assert_called_once_with()
+
     if will_update:
-        gmu_mock.assert_called_once_with(request_all=parse_all)
+        gmu_mock.assert_called_once_with(request_all=parse_all, on_url=mock.ANY)
         std_mock.assert_called_once_with()
         parse_mock.assert_called()
         # gmu_mock returns 2 subdomains of example.com
@@ -308,6 +333,139 @@ def test_load(load_mocks, force, tid, should_update, parse_all, client):
         parse_mock.assert_not_called()
 
 
+@mock.patch("app.menus.core.daily_menus_manager.refresher", autospec=True)
+def test_load_background(refresher_mock, load_mocks, parse_all, client):
+    std_mock, contains_mock, lfd_mock, su_mock, parse_mock, gmu_mock = load_mocks
+    contains_mock.return_value = False
+    su_mock.return_value = True
+
+    dmm = DailyMenusManager.load(parse_all=parse_all, background=True)
+    assert dmm.updated is True
+
+    if parse_all:
+        # Parse all is always made in the foreground
+        assert dmm.refreshing is False
+        refresher_mock.request_update.assert_not_called()
+        gmu_mock.assert_called_once_with(request_all=True, on_url=mock.ANY)
+        std_mock.assert_called_once_with()
+    else:
+        assert dmm.refreshing is True
+        refresher_mock.request_update.assert_called_once_with()
+        gmu_mock.assert_not_called()
+        std_mock.assert_not_called()
+        parse_mock.assert_not_called()
+
+
+@mock.patch("app.menus.core.daily_menus_manager.refresher", autospec=True)
+def test_load_background_config(refresher_mock, load_mocks, client):
+    std_mock, contains_mock, lfd_mock, su_mock, parse_mock, gmu_mock = load_mocks
+    contains_mock.return_value = False
+    su_mock.return_value = True
+
+    client.application.config["BACKGROUND_REFRESH"] = True
+    try:
+        DailyMenusManager.load()
+    finally:
+        client.application.config["BACKGROUND_REFRESH"] = False
+
+    refresher_mock.request_update.assert_called_once_with()
+    gmu_mock.assert_not_called()
+
+
+class TestUpdateFromWeb:
+    @pytest.fixture
+    def gmu_mock(self):
+        with mock.patch(
+            "app.menus.core.daily_menus_manager.get_menus_urls", autospec=True
+        ) as gmu_mock:
+            gmu_mock.return_value = []
+            yield gmu_mock
+
+    @pytest.fixture
+    def file_lock(self, client):
+        path = client.application.config["DATABASE_PATH"]
+        file_lock = FileLock(path.with_name(path.name + ".lock"))
+        yield file_lock
+        file_lock.release()
+
+    @staticmethod
+    def run_in_thread(target):
+        results = []
+        thread = Thread(target=lambda: results.append(target()))
+        thread.start()
+        return thread, results
+
+    def test_single_update(self, gmu_mock, client):
+        dmm = DailyMenusManager()
+        assert dmm.update_from_web() is True
+        gmu_mock.assert_called_once_with(request_all=False, on_url=mock.ANY)
+
+        assert UpdateControl.get_last_update().date() == now().date()
+
+    def test_concurrent_updates_in_threads(self, gmu_mock, client):
+        started = Event()
+        finish = Event()
+
+        def get_menus_urls(request_all, on_url):
+            started.set()
+            finish.wait(5)
+            return []
+
+        gmu_mock.side_effect = get_menus_urls
+        app = client.application
+
+        def update():
+            with app.app_context():
+                return DailyMenusManager().update_from_web()
+
+        thread_1, results_1 = self.run_in_thread(update)
+        started.wait(5)
+        thread_2, results_2 = self.run_in_thread(update)
+        time.sleep(0.1)
+        finish.set()
+        thread_1.join(5)
+        thread_2.join(5)
+
+        gmu_mock.assert_called_once_with(request_all=False, on_url=mock.ANY)
+        assert results_1 == [True]
+        assert results_2 == [False]
+
+    def test_concurrent_updates_in_processes(self, gmu_mock, file_lock, client):
+        # Lock acquired by "other process"
+        assert file_lock.acquire(blocking=False) is True
+        app = client.application
+
+        def update():
+            with app.app_context():
+                return DailyMenusManager().update_from_web()
+
+        thread, results = self.run_in_thread(update)
+        time.sleep(0.1)
+        assert thread.is_alive()
+
+        file_lock.release()
+        thread.join(5)
+
+        assert results == [False]
+        gmu_mock.assert_not_called()
+
+    def test_parse_all_does_not_reuse(self, gmu_mock, file_lock, client):
+        assert file_lock.acquire(blocking=False) is True
+        app = client.application
+
+        def update():
+            with app.app_context():
+                return DailyMenusManager().update_from_web(parse_all=True)
+
+        thread, results = self.run_in_thread(update)
+        time.sleep(0.1)
+        file_lock.release()
+        thread.join(5)
+
+        assert results == [True]
+        gmu_mock.assert_called_once_with(request_all=True, on_url=mock.ANY)
+
+
 def test_to_json():
     dmm = DailyMenusManager()
     menu1 = DailyMenu(
@@ -372,17 +530,17 @@ def test_load_from_database(atm_mock, list_menus_mock, client):
 
 @mock.patch("app.menus.core.daily_menus_manager.logger.debug", autospec=True)
 @mock.patch(
-    "app.menus.core.daily_menus_manager.UpdateControl.get_last_update", autospec=True
+    "app.menus.core.daily_menus_manager.DailyMenusDatabaseController.save_daily_menus"
 )
-def test_save_to_database(glu_mock, debug_mock):
-    glu_mock.return_value = "[info]"
-    menu_mock = mock.Mock()
-    menu_mock.to_string.return_value = "DailyMenu(mock)"
+def test_save_to_database(sdm_mock, debug_mock):
+    sdm_mock.return_value = BulkSaveResult(1, 1)
+    menu_1 = DailyMenu(1, 1, 2019)
+    menu_2 = DailyMenu(2, 1, 2019)
 
     dmm = DailyMenusManager()
-    dmm.add_to_menus([menu_mock, menu_mock])
-    dmm.save_to_database()
+    dmm.add_to_menus([menu_1, menu_2])
+    result = dmm.save_to_database()
 
-    menu_mock.to_database.assert_called()
-    assert menu_mock.to_database.call_count == 2
+    sdm_mock.assert_called_once_with([menu_1, menu_2])
+    assert result == (1, 1)
     debug_mock.assert_called_with("Saving menus to database")
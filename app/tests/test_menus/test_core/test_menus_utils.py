@@ -53,6 +53,7 @@ class TestGetMenusUrls:
         expected = json.loads(output_data)
         interface = mock.MagicMock()
         interface.text = input_data
+        interface.headers = {}
         get_mock.return_value = interface
 
         real = get_menus_urls(request_all=False)
@@ -73,42 +74,149 @@ class TestGetMenusUrls:
         assert real == []
 
     @pytest.mark.parametrize("errors", [False, *range(1, len(gmu_test_data) + 1)])
-    def test_request_all(self, logger_mock, get_mock, errors):
+    @mock.patch("app.menus.core.crawler.logger", autospec=True)
+    def test_request_all(self, crawler_logger_mock, logger_mock, get_mock, errors):
         expected = []
-        interfaces = []
+        interfaces = {}
         ngood = 0
         nbad = 0
 
-        for input_data, output_data in gmu_test_data:
+        for index, (input_data, output_data) in enumerate(gmu_test_data, 1):
             if nbad == errors:
                 expected += json.loads(output_data)
                 interface = mock.MagicMock()
                 interface.text = input_data
-                interfaces.append(interface)
+                interface.headers = {}
+                interfaces[TEMPLATE % index] = interface
                 ngood += 1
             else:
-                interfaces.append(DownloaderError)
+                interfaces[TEMPLATE % index] = DownloaderError
                 nbad += 1
 
         ndata = ngood + nbad
 
         invalid_interface = mock.MagicMock()
         invalid_interface.text = GMUDP.invalid.value.read_text(encoding="utf-8")
+        invalid_interface.headers = {}
         ndata += 1  # the invalid one
 
-        interfaces.append(invalid_interface)
-        get_mock.side_effect = interfaces
+        def get(url):
+            interface = interfaces.get(url, invalid_interface)
+            if interface is DownloaderError:
+                raise DownloaderError
+            return interface
+
+        get_mock.side_effect = get
 
         real = get_menus_urls(request_all=True)
 
         logger_mock.debug.assert_called_once()
-        assert get_mock.call_count == ndata
+
+        # Pages after the invalid one may be requested speculatively
+        lookahead = current_app.config["CRAWLER_LOOKAHEAD"]
+        assert ndata <= get_mock.call_count < ndata + lookahead
         assert real == expected
-        assert logger_mock.warning.call_count == nbad
+        assert crawler_logger_mock.warning.call_count == nbad
 
         if nbad == len(gmu_test_data):
             assert real == []
 
+    @mock.patch("app.menus.core.crawler.crawl_menus_urls", autospec=True)
+    def test_request_all_uses_crawler(self, crawl_mock, logger_mock, get_mock):
+        on_url = mock.MagicMock()
+        assert get_menus_urls(True, on_url) == crawl_mock.return_value
+
+        crawl_mock.assert_called_once_with(on_url)
+        get_mock.assert_not_called()
+
+    def test_on_url(self, logger_mock, get_mock):
+        input_data, output_data = gmu_test_data[0]
+        get_mock.return_value.text = input_data
+        get_mock.return_value.headers = {}
+        on_url = mock.MagicMock()
+
+        real = get_menus_urls(on_url=on_url)
+
+        assert real == json.loads(output_data)
+        assert on_url.call_args_list == [mock.call(x) for x in real]
+
+
+class TestGetMenusUrlsConditional:
+    @pytest.fixture(autouse=True)
+    def autouse_client(self, client):
+        current_app.config["OFFLINE"] = False
+        yield
+
+    @pytest.fixture
+    def get_mock(self):
+        with mock.patch("app.menus.core.utils.downloader.request") as request_mock:
+            yield request_mock
+
+    @staticmethod
+    def get_headers(get_mock):
+        assert get_mock.call_args[0] == ("GET", TEMPLATE % 1)
+        return get_mock.call_args[1].get("headers")
+
+    @staticmethod
+    def response(text="", status_code=200, headers=None):
+        response = mock.MagicMock()
+        response.text = text
+        response.status_code = status_code
+        response.headers = {"ETag": "etag"} if headers is None else headers
+        return response
+
+    def test_not_modified(self, get_mock):
+        input_data, output_data = gmu_test_data[0]
+        get_mock.return_value = self.response(input_data)
+        expected = json.loads(output_data)
+
+        assert get_menus_urls() == expected
+        get_mock.assert_called_once()
+        assert self.get_headers(get_mock) is None
+
+        get_mock.return_value = self.response(status_code=304)
+        assert get_menus_urls() == expected
+        assert self.get_headers(get_mock) == {"If-None-Match": "etag"}
+
+    def test_modified(self, get_mock):
+        get_mock.return_value = self.response(gmu_test_data[0][0])
+        get_menus_urls()
+
+        get_mock.return_value = self.response(gmu_test_data[1][0])
+        assert get_menus_urls() == json.loads(gmu_test_data[1][1])
+
+    def test_request_all_not_modified(self, get_mock):
+        invalid = GMUDP.invalid.value.read_text(encoding="utf-8")
+        get_mock.side_effect = [
+            self.response(gmu_test_data[0][0]),
+            self.response(gmu_test_data[1][0]),
+            self.response(invalid),
+        ]
+        expected = get_menus_urls(request_all=True)
+        assert expected
+
+        get_mock.side_effect = [self.response(status_code=304)] * 3
+        assert get_menus_urls(request_all=True) == expected
+        assert get_mock.call_count == 6
+
+    def test_without_validators(self, get_mock):
+        get_mock.return_value = self.response(gmu_test_data[0][0], headers={})
+        get_menus_urls()
+        get_menus_urls()
+
+        assert self.get_headers(get_mock) is None
+
+    def test_disabled(self, get_mock):
+        current_app.config["CONDITIONAL_REQUESTS"] = False
+        try:
+            get_mock.return_value = self.response(gmu_test_data[0][0])
+            get_menus_urls()
+            get_menus_urls()
+        finally:
+            current_app.config["CONDITIONAL_REQUESTS"] = True
+
+        assert self.get_headers(get_mock) is None
+
 
 class TestGetLastMenusUrl:
     url_expected = (
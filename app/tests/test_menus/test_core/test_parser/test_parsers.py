@@ -1,22 +1,35 @@
-from collections import UserList
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from threading import Event, Lock
 from unittest import mock
 
 import pytest
 
+from app.menus.core.daily_menus_manager import DailyMenusManager
+from app.menus.core.structure import DailyMenu
+from app.menus.core.exceptions import ParserError
+from app.menus.models import HttpCache, ParseCache, connection_pool
 from app.menus.core.parser import (
     KNOWN_UNPARSEABLE_URLS,
+    ParserJob,
+    ParserJobGroup,
     Parsers,
-    ParserThread,
-    ParserThreadList,
+    parse_menus,
 )
+from app.tests.data.data import ParserPaths
 from app.utils.exceptions import DownloaderError
 
+html_paths = ParserPaths.html.value[:3]
 
-class TestParserThread:
+
+class TestParserJob:
     def test_attributes(self):
-        thread = ParserThread(None, None)
-        assert hasattr(thread, "url")
-        assert hasattr(thread, "dmm")
+        job = ParserJob(None, None)
+        assert hasattr(job, "url")
+        assert hasattr(job, "dmm")
+        assert hasattr(job, "process_executor")
+        assert hasattr(job, "parse_cache")
+        assert hasattr(job, "http_cache")
 
     @pytest.fixture
     def parser_mocks(self):
@@ -43,9 +56,8 @@ class TestParserThread:
         get_mock.return_value.text = "text"
         dmm = mock.MagicMock()
 
-        thread = ParserThread("url", dmm)
-        thread.start()
-        thread.join()
+        job = ParserJob("url", dmm)
+        job.run()
 
         # First parser is called
         html_mock.process_text.assert_called_once()
@@ -72,9 +84,8 @@ class TestParserThread:
         get_mock.return_value.text = "text"
         dmm = mock.MagicMock()
 
-        thread = ParserThread(url, dmm)
-        thread.start()
-        thread.join()
+        job = ParserJob(url, dmm)
+        job.run()
 
         # Warning stating url is in KNOWN_UNPARSEABLE_URLS
         logger_mock.warning.assert_called_once()
@@ -105,9 +116,8 @@ class TestParserThread:
         html_mock.process_text.side_effect = ValueError
         manual_mock.process_text.return_value = True
 
-        thread = ParserThread("url", dmm)
-        thread.start()
-        thread.join()
+        job = ParserJob("url", dmm)
+        job.run()
 
         # parser.process_text.assert_called()
         # assert parser.process_text.call_count == 3
@@ -142,9 +152,9 @@ class TestParserThread:
         html_mock.process_text.side_effect = ValueError
         manual_mock.process_text.side_effect = ValueError
 
-        thread = ParserThread("url", dmm)
-        thread.start()
-        thread.join()
+        job = ParserJob("url", dmm)
+        with pytest.raises(ParserError, match="None of the parsers could parse"):
+            job.run()
 
         # Both parsers should be called 1 times
         html_mock.process_text.assert_called_once()
@@ -176,9 +186,9 @@ class TestParserThread:
         foo_mock.text = "text"
         get_mock.side_effect = DownloaderError
 
-        thread = ParserThread("url", dmm)
-        thread.start()
-        thread.join()
+        job = ParserJob("url", dmm)
+        with pytest.raises(DownloaderError, match="Fatal connection error"):
+            job.run()
 
         # None of the parsers called due to fatal error
         html_mock.process_text.assert_not_called()
@@ -207,9 +217,9 @@ class TestParserThread:
         foo_mock.text = "text"
         get_mock.side_effect = DownloaderError
 
-        thread = ParserThread("url", dmm)
-        thread.start()
-        thread.join()
+        job = ParserJob("url", dmm)
+        with pytest.raises(DownloaderError, match="Fatal connection error"):
+            job.run()
 
         # No parsers are called
         html_mock.process_text.assert_not_called()
@@ -230,53 +240,301 @@ class TestParserThread:
         logger_mock.error.assert_called_once()
 
 
-class TestParserList:
+class TestProcessParsing:
+    @pytest.fixture(scope="class")
+    def process_executor(self):
+        executor = ProcessPoolExecutor(max_workers=2)
+        yield executor
+        executor.shutdown()
+
+    @pytest.mark.parametrize("html_path", html_paths)
+    def test_parse_menus(self, html_path):
+        text = html_path.read_text(encoding="utf-8")
+        dmm = DailyMenusManager()
+        with mock.patch("app.menus.core.parser.downloader.get") as get_mock:
+            get_mock.return_value.text = text
+            ParserJob("url", dmm).run()
+
+        assert parse_menus(text, "url") == dmm.menus
+
+    @pytest.mark.parametrize("html_path", html_paths)
+    def test_run_same_result_as_threads(self, html_path, process_executor):
+        text = html_path.read_text(encoding="utf-8")
+        thread_dmm = DailyMenusManager()
+        process_dmm = DailyMenusManager()
+
+        with mock.patch("app.menus.core.parser.downloader.get") as get_mock:
+            get_mock.return_value.text = text
+            ParserJob("url", thread_dmm).run()
+            ParserJob("url", process_dmm, process_executor).run()
+
+        assert process_dmm.menus
+        assert process_dmm.to_json() == thread_dmm.to_json()
+
+    def test_run_error(self, process_executor):
+        dmm = DailyMenusManager()
+        with mock.patch("app.menus.core.parser.downloader.get") as get_mock:
+            get_mock.return_value.text = "<html></html>"
+            with pytest.raises(ParserError, match="None of the parsers could parse"):
+                ParserJob("url", dmm, process_executor).run()
+
+        assert not dmm.menus
+
+
+class TestParseCache:
     @pytest.fixture
-    def parser_thread_list(self):
-        return ParserThreadList()
+    def cache(self, tmp_path):
+        yield ParseCache(tmp_path / "cache.db")
+        connection_pool.close_all()
 
-    def test_inherintance(self, parser_thread_list):
-        assert isinstance(parser_thread_list, UserList)
-        assert hasattr(parser_thread_list, "__getitem__")
-        assert hasattr(parser_thread_list, "__setitem__")
-        assert hasattr(parser_thread_list, "__delitem__")
-        assert hasattr(parser_thread_list, "__len__")
-        assert hasattr(parser_thread_list, "__iter__")
+    @pytest.fixture
+    def get_mock(self):
+        with mock.patch("app.menus.core.parser.downloader.get") as get_mock:
+            get_mock.return_value.text = html_paths[0].read_text(encoding="utf-8")
+            yield get_mock
 
-    @pytest.mark.parametrize(
-        "parser", [ParserThread(None, None), ParserThread(None, None)]
-    )
-    def test_append_valid(self, parser, parser_thread_list):
-        parser_thread_list.append(parser)
+    def test_run_stores_menus(self, cache, get_mock):
+        dmm = DailyMenusManager()
+        ParserJob("url", dmm, parse_cache=cache).run()
 
-    @pytest.mark.parametrize("not_parser", ["a", 5, 1 + 3j, False, True])
-    def test_append_invalid(self, not_parser, parser_thread_list):
-        with pytest.raises(TypeError):
-            parser_thread_list.append(not_parser)
+        text_hash = cache.hash_text(get_mock.return_value.text)
+        assert dmm.menus
+        assert cache.get("url", text_hash) == dmm.menus
 
+    @mock.patch("app.menus.core.parser.parse_menus")
+    def test_run_uses_cache(self, parse_mock, cache, get_mock):
+        menus = [DailyMenu(1, 1, 2003, url="url")]
+        cache.set("url", cache.hash_text(get_mock.return_value.text), menus)
 
-class TestParsers:
-    @mock.patch("app.menus.core.parser.ParserThread")
-    @mock.patch("app.menus.core.parser.ParserThreadList.append")
-    def test_parse(self, append_mock, thread_mock):
+        dmm = DailyMenusManager()
+        ParserJob("url", dmm, parse_cache=cache).run()
+
+        parse_mock.assert_not_called()
+        assert dmm.menus == menus
+
+    @mock.patch("app.menus.core.parser.parse_menus")
+    def test_run_text_changed(self, parse_mock, cache, get_mock):
+        menus = [DailyMenu(1, 1, 2003, url="url")]
+        cache.set("url", "old-hash", [])
+        parse_mock.return_value = menus
+
+        dmm = DailyMenusManager()
+        ParserJob("url", dmm, parse_cache=cache).run()
+
+        parse_mock.assert_called_once_with(get_mock.return_value.text, "url")
+        assert dmm.menus == menus
+        assert cache.get("url", "old-hash") is None
+
+    def test_run_errors_not_cached(self, cache, get_mock):
+        get_mock.return_value.text = "<html></html>"
+        with pytest.raises(ParserError):
+            ParserJob("url", DailyMenusManager(), parse_cache=cache).run()
+
+        assert cache.get("url", cache.hash_text("<html></html>")) is None
+
+
+class TestConditionalRequests:
+    @pytest.fixture
+    def caches(self, tmp_path):
+        yield ParseCache(tmp_path / "cache.db"), HttpCache(tmp_path / "cache.db")
+        connection_pool.close_all()
+
+    @pytest.fixture
+    def downloader_mock(self):
+        with mock.patch("app.menus.core.parser.downloader") as downloader_mock:
+            response = downloader_mock.get.return_value
+            response.status_code = 200
+            response.text = html_paths[0].read_text(encoding="utf-8")
+            downloader_mock.get_validators.return_value = ("etag", None)
+            downloader_mock.conditional_get.return_value.status_code = 304
+            yield downloader_mock
+
+    def test_conditional(self, caches):
+        parse_cache, http_cache = caches
+        assert ParserJob("url", None, None, parse_cache, http_cache).conditional
+        assert not ParserJob("url", None, None, None, http_cache).conditional
+        assert not ParserJob("url", None, None, parse_cache, None).conditional
+
+    def test_run_not_modified(self, caches, downloader_mock):
+        parse_cache, http_cache = caches
+
+        dmm = DailyMenusManager()
+        ParserJob("url", dmm, None, parse_cache, http_cache).run()
+        downloader_mock.get.assert_called_once_with("url")
+        downloader_mock.conditional_get.assert_not_called()
+        assert http_cache.get("url").etag == "etag"
+
+        other_dmm = DailyMenusManager()
+        with mock.patch("app.menus.core.parser.parse_menus") as parse_mock:
+            ParserJob("url", other_dmm, None, parse_cache, http_cache).run()
+
+        downloader_mock.conditional_get.assert_called_once_with("url", "etag", None)
+        parse_mock.assert_not_called()
+        assert other_dmm.menus == dmm.menus
+
+    def test_run_not_modified_without_parse_cache(self, caches, downloader_mock):
+        parse_cache, http_cache = caches
+        http_cache.set("url", "etag", None)
+
+        dmm = DailyMenusManager()
+        ParserJob("url", dmm, None, parse_cache, http_cache).run()
+
+        downloader_mock.conditional_get.assert_called_once_with("url", "etag", None)
+        assert not dmm.menus
+        assert http_cache.get("url") is None
+
+    def test_run_modified(self, caches, downloader_mock):
+        parse_cache, http_cache = caches
+        http_cache.set("url", "old-etag", None)
+        downloader_mock.conditional_get.return_value = downloader_mock.get.return_value
+
+        dmm = DailyMenusManager()
+        ParserJob("url", dmm, None, parse_cache, http_cache).run()
+
+        downloader_mock.conditional_get.assert_called_once_with("url", "old-etag", None)
+        assert dmm.menus
+        assert http_cache.get("url").etag == "etag"
+
+    def test_run_errors_not_stored(self, caches, downloader_mock):
+        parse_cache, http_cache = caches
+        downloader_mock.get.return_value.text = "<html></html>"
+
+        with pytest.raises(ParserError):
+            ParserJob("url", DailyMenusManager(), None, parse_cache, http_cache).run()
+
+        assert http_cache.get("url") is None
+
+
+class TestParserJobGroup:
+    @pytest.fixture
+    def group(self):
+        executor = ThreadPoolExecutor(max_workers=2)
+        yield ParserJobGroup(executor)
+        executor.shutdown()
+
+    @mock.patch("app.menus.core.parser.ParserJob")
+    def test_parse(self, job_mock, group):
         url = mock.MagicMock()
         dmm = mock.MagicMock()
-        Parsers.parse(url, dmm)
+        job_mock.return_value.run.return_value = "result"
+
+        future = group.parse(url, dmm)
+
+        assert isinstance(future, Future)
+        assert future.result() == "result"
+        job_mock.assert_called_once_with(url, dmm, None, None, None)
+        job_mock.return_value.run.assert_called_once_with()
+        assert len(group) == 1
+
+    @mock.patch("app.menus.core.parser.ParserJob")
+    def test_join(self, job_mock, group):
+        job_mock.return_value.run.side_effect = [None, ValueError]
+        future_1 = group.parse("url-1", None)
+        future_2 = group.parse("url-2", None)
 
-        thread_mock.assert_called_once()
-        thread_mock.return_value.start.assert_called_once()
-        append_mock.assert_called_once_with(thread_mock.return_value)
+        # Exceptions are not raised
+        assert group.join() == [future_1, future_2]
+        assert future_1.done()
+        assert future_2.done()
 
-    @mock.patch("app.menus.core.parser.ParserThreadList.append")
-    def test_append(self, append_mock):
-        thread = ParserThread(None, None)
-        Parsers._append(thread)
-        append_mock.assert_called_with(thread)
+        # Futures are released after join
+        assert len(group) == 0
+        assert group.join() == []
 
-    def test_join(self):
-        thread_mock = mock.MagicMock()
-        Parsers._threads = [thread_mock] * 10
-        Parsers.join()
+    @mock.patch("app.menus.core.parser.ParserJob")
+    def test_context_manager(self, job_mock, group):
+        with group as group_2:
+            assert group_2 is group
+            future = group.parse("url", None)
 
-        thread_mock.join.assert_called_with()
-        assert thread_mock.join.call_count == 10
+        assert future.done()
+        assert len(group) == 0
+
+    def test_groups_are_independent(self, group):
+        other_group = ParserJobGroup(group.executor)
+        blocker = Event()
+        with mock.patch("app.menus.core.parser.ParserJob") as job_mock:
+            job_mock.return_value.run.side_effect = lambda: blocker.wait(5)
+            slow = other_group.parse("url", None)
+
+        # Joining a group doesn't wait for the jobs of other groups
+        group.join()
+        assert not slow.done()
+
+        blocker.set()
+        other_group.join()
+
+
+class TestParsers:
+    @pytest.fixture(autouse=True)
+    def reset_parsers(self, client):
+        Parsers._executor = None
+        Parsers._process_executor = None
+        yield
+        if Parsers._executor is not None:
+            Parsers._executor.shutdown()
+        if Parsers._process_executor is not None:
+            Parsers._process_executor.shutdown()
+        Parsers._executor = None
+        Parsers._process_executor = None
+
+    def test_get_executor(self, client):
+        executor = Parsers.get_executor()
+        assert isinstance(executor, ThreadPoolExecutor)
+        assert executor._max_workers == client.application.config["PARSER_WORKERS"]
+        assert Parsers.get_executor() is executor
+
+    def test_group(self):
+        group_1 = Parsers.group()
+        group_2 = Parsers.group()
+
+        assert isinstance(group_1, ParserJobGroup)
+        assert group_1 is not group_2
+        assert group_1.executor is group_2.executor is Parsers.get_executor()
+        assert group_1.process_executor is None
+        assert isinstance(group_1.parse_cache, ParseCache)
+        assert isinstance(group_1.http_cache, HttpCache)
+
+    def test_group_without_parse_cache(self, client):
+        with mock.patch.dict(client.application.config, {"PARSE_CACHE": False}):
+            assert Parsers.group().parse_cache is None
+
+    def test_group_without_http_cache(self, client):
+        config = {"CONDITIONAL_REQUESTS": False}
+        with mock.patch.dict(client.application.config, config):
+            assert Parsers.group().http_cache is None
+
+    def test_get_process_executor_disabled(self, client):
+        assert client.application.config["PARSER_PROCESSES"] == 0
+        assert Parsers.get_process_executor() is None
+
+    def test_get_process_executor(self, client):
+        with mock.patch.dict(client.application.config, {"PARSER_PROCESSES": 2}):
+            executor = Parsers.get_process_executor()
+            assert isinstance(executor, ProcessPoolExecutor)
+            assert executor._max_workers == 2
+            assert Parsers.get_process_executor() is executor
+            assert Parsers.group().process_executor is executor
+
+    @mock.patch("app.menus.core.parser.ParserJob")
+    def test_bounded_workers(self, job_mock, client):
+        lock = Lock()
+        running = []
+        max_running = []
+
+        def run():
+            with lock:
+                running.append(None)
+                max_running.append(len(running))
+            time.sleep(0.02)
+            with lock:
+                running.pop()
+
+        job_mock.return_value.run.side_effect = run
+
+        with Parsers.group() as group:
+            for _ in range(20):
+                group.parse("url", None)
+
+        assert job_mock.return_value.run.call_count == 20
+        assert max(max_running) <= client.application.config["PARSER_WORKERS"]
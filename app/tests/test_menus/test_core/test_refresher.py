@@ -0,0 +1,97 @@
+import time
+from unittest import mock
+
+import pytest
+
+from app.menus.core.refresher import Refresher, init_app
+
+
+@pytest.fixture
+def refresher():
+    refresher = Refresher()
+    yield refresher
+    refresher.stop()
+
+
+@pytest.fixture
+def load_mock():
+    with mock.patch(
+        "app.menus.core.daily_menus_manager.DailyMenusManager.load"
+    ) as load_mock:
+        yield load_mock
+
+
+def wait_for(condition, timeout=5):
+    limit = time.time() + timeout
+    while not condition():
+        if time.time() > limit:
+            raise TimeoutError
+        time.sleep(0.01)
+
+
+def test_attributes(refresher):
+    assert refresher.app is None
+    assert refresher.interval is None
+    assert refresher.last_refresh is None
+    assert refresher.is_running is False
+
+
+def test_request_update(refresher, load_mock, client):
+    refresher.request_update()
+
+    assert refresher.is_running is True
+    assert refresher.app is client.application
+    wait_for(lambda: refresher.last_refresh is not None)
+    load_mock.assert_called_once_with(force=True, background=False)
+
+    refresher.request_update()
+    wait_for(lambda: load_mock.call_count == 2)
+
+
+def test_scheduled(refresher, load_mock, client):
+    with mock.patch.dict(client.application.config, {"REFRESH_INTERVAL": 0.05}):
+        refresher.start(client.application)
+
+    assert refresher.interval == 0.05
+    wait_for(lambda: load_mock.call_count >= 3)
+    load_mock.assert_called_with(force=True, background=False)
+
+
+def test_start_only_once(refresher, load_mock, client):
+    refresher.start(client.application)
+    thread = refresher._thread
+    refresher.start(client.application)
+
+    assert refresher._thread is thread
+
+
+def test_errors_do_not_stop_refresher(refresher, load_mock, client):
+    load_mock.side_effect = ValueError
+    refresher.request_update()
+    wait_for(lambda: refresher.last_refresh is not None)
+
+    assert refresher.is_running is True
+
+
+def test_stop(refresher, load_mock, client):
+    refresher.start(client.application)
+    refresher.stop()
+
+    assert refresher.is_running is False
+    load_mock.assert_not_called()
+
+    refresher.request_update()
+    wait_for(lambda: load_mock.call_count == 1)
+
+
+@pytest.mark.parametrize("enabled", [True, False])
+def test_init_app(enabled):
+    app_mock = mock.MagicMock()
+    app_mock.config = {"BACKGROUND_REFRESH": enabled}
+
+    init_app(app_mock)
+
+    if enabled:
+        app_mock.before_first_request.assert_called_once()
+    else:
+        app_mock.before_first_request.assert_not_called()
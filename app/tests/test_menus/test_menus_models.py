@@ -1,3 +1,4 @@
+import os
 import sqlite3
 from datetime import datetime, timedelta
 from unittest import mock
@@ -6,16 +7,21 @@ import pytest
 
 from app.menus.core.structure import DailyMenu, Meal
 from app.menus.models import (
+    ConnectionPool,
     DailyMenusDatabaseController,
     DatabaseConnection,
+    HttpCache,
+    HttpCacheEntry,
+    ParseCache,
     UpdateControl,
+    connection_pool,
 )
 from app.utils import now
 
 
 @mock.patch("app.menus.models.DatabaseConnection")
 class TestDailyMenusDatabaseController:
-    def test_list_menus(self, mock_db_connection):
+    def test_list_menus(self, mock_db_connection, client):
         # It should use a context manager (__enter__)
         mock_db_connection.return_value.__enter__.return_value.fetch_all.return_value = [
             [1, 1, 1998, "cm-11", "cm-12", "cn-11", "cn-12", "url-1"],
@@ -57,6 +63,32 @@ class TestDailyMenusDatabaseController:
             assert result is True
             mock_connection.commit.assert_called()
 
+    def test_save_daily_menus(self, mock_db):
+        menu_1 = DailyMenu(1, 2, 2003, Meal("a", "b"), Meal("c", "d"), "url-1")
+        menu_2 = DailyMenu(2, 2, 2003, Meal("e", "f"), Meal("g", "h"), "url-2")
+        mock_connection = mock_db.return_value.__enter__.return_value
+        mock_connection.cursor.rowcount = 1
+
+        result = DailyMenusDatabaseController.save_daily_menus([menu_1, menu_2])
+
+        mock_connection.executemany.assert_called_once()
+        query, data = mock_connection.executemany.call_args[0]
+        assert "ON CONFLICT(id) DO NOTHING" in query
+        assert data == [
+            (20030201, 1, 2, 2003, "a", "b", "c", "d", "url-1"),
+            (20030202, 2, 2, 2003, "e", "f", "g", "h", "url-2"),
+        ]
+        mock_connection.commit.assert_called_once()
+        assert result == (1, 1)
+        assert result.inserted == 1
+        assert result.skipped == 1
+
+    def test_save_daily_menus_empty(self, mock_db):
+        result = DailyMenusDatabaseController.save_daily_menus([])
+
+        mock_db.assert_not_called()
+        assert result == (0, 0)
+
     @pytest.mark.parametrize("menus_number", [0, 1])
     def test_remove_daily_menu(self, mock_db, menus_number):
         menu = DailyMenu(1, 2, 2003, Meal("a", "b"), Meal("c", "d"))
@@ -86,6 +118,101 @@ class TestDailyMenusDatabaseController:
             mock_connection.commit.assert_not_called()
 
 
+def test_save_daily_menus_database(client):
+    menus = [
+        DailyMenu(e, 1, 2003, Meal("a", "b"), Meal("c", "d"), "url")
+        for e in range(1, 6)
+    ]
+
+    assert DailyMenusDatabaseController.save_daily_menus(menus[:3]) == (3, 0)
+    assert DailyMenusDatabaseController.save_daily_menus(menus) == (2, 3)
+    assert DailyMenusDatabaseController.list_menus() == menus[::-1]
+
+
+@pytest.mark.parametrize(
+    "first_id, last_id, limit, expected",
+    [
+        (None, None, None, [5, 4, 3, 2, 1]),
+        (20030102, None, None, [5, 4, 3, 2]),
+        (None, 20030103, None, [3, 2, 1]),
+        (20030102, 20030104, None, [4, 3, 2]),
+        (20030102, 20030104, 2, [4, 3]),
+        (None, None, 1, [5]),
+        (20030104, 20030102, None, []),
+    ],
+)
+def test_list_menus_between(client, first_id, last_id, limit, expected):
+    menus = [DailyMenu(e, 1, 2003) for e in range(1, 6)]
+    DailyMenusDatabaseController.save_daily_menus(menus)
+
+    result = DailyMenusDatabaseController.list_menus_between(first_id, last_id, limit)
+    assert [x.day for x in result] == expected
+
+
+class TestMenusCache:
+    @pytest.fixture(autouse=True)
+    def autouse_client(self, client):
+        yield client
+
+    @pytest.fixture
+    def menus(self):
+        return [
+            DailyMenu(e, 1, 2003, Meal("a", "b"), Meal("c", "d"), "url")
+            for e in range(1, 4)
+        ]
+
+    def test_cached(self, menus):
+        DailyMenusDatabaseController.save_daily_menus(menus)
+        menus_1 = DailyMenusDatabaseController.list_menus()
+
+        with mock.patch("app.menus.models.DatabaseConnection") as db_mock:
+            menus_2 = DailyMenusDatabaseController.list_menus()
+            db_mock.assert_not_called()
+
+        assert menus_1 == menus_2
+        assert menus_1 is not menus_2
+        assert all(x is y for x, y in zip(menus_1, menus_2))
+
+    def test_invalidate_on_save(self, menus):
+        DailyMenusDatabaseController.save_daily_menus(menus[:2])
+        assert len(DailyMenusDatabaseController.list_menus()) == 2
+
+        DailyMenusDatabaseController.save_daily_menu(menus[2])
+        assert len(DailyMenusDatabaseController.list_menus()) == 3
+
+    def test_invalidate_on_remove(self, menus):
+        DailyMenusDatabaseController.save_daily_menus(menus)
+        assert len(DailyMenusDatabaseController.list_menus()) == 3
+
+        DailyMenusDatabaseController.remove_daily_menu(menus[0])
+        assert len(DailyMenusDatabaseController.list_menus()) == 2
+
+    def test_expires_when_day_changes(self, menus):
+        DailyMenusDatabaseController.save_daily_menus(menus)
+        DailyMenusDatabaseController.list_menus()
+
+        with mock.patch("app.menus.models.now") as now_mock:
+            now_mock.return_value = now() + timedelta(days=1)
+            with mock.patch("app.menus.models.DatabaseConnection") as db_mock:
+                DailyMenusDatabaseController.list_menus()
+                db_mock.assert_called()
+
+    def test_expires_when_database_changes(self, menus, client):
+        DailyMenusDatabaseController.save_daily_menus(menus)
+        DailyMenusDatabaseController.list_menus()
+
+        # Changes made without the controller, like other processes do
+        database_path = client.application.config["DATABASE_PATH"]
+        connection = sqlite3.connect(database_path)
+        connection.execute("DELETE FROM 'daily_menus'")
+        connection.commit()
+        connection.close()
+        mtime = database_path.stat().st_mtime_ns + 1
+        os.utime(database_path, ns=(mtime, mtime))
+
+        assert DailyMenusDatabaseController.list_menus() == []
+
+
 class TestDatabaseConnection:
     @pytest.fixture(autouse=True)
     def autouse_client(self, client):
@@ -100,7 +227,8 @@ class TestDatabaseConnection:
 
         mock_sqlite_connect.assert_called()
         assert mock_sqlite_connect.call_count == 2
-        connection_mock.cursor.assert_called_once()
+        # One cursor to create the schema and another one for the DatabaseConnection
+        assert connection_mock.cursor.call_count == 2
 
     @mock.patch("app.menus.models.DatabaseConnection.close")
     @mock.patch("sqlite3.connect")
@@ -117,13 +245,22 @@ class TestDatabaseConnection:
     @mock.patch("sqlite3.connect")
     def test_close(self, mock_sqlite_connect):
         connection = DatabaseConnection()
-        mock_sqlite_connect.assert_called()
+        mock_sqlite_connect.assert_called_once()
 
         db_connection = mock_sqlite_connect.return_value
+        connection.close()
+
+        # The connection is given back to the pool instead of being closed
         db_connection.close.assert_not_called()
+        connection.cursor.close.assert_called()
 
-        connection.close()
-        db_connection.close.assert_called()
+        other_connection = DatabaseConnection()
+        assert other_connection.connection is db_connection
+        mock_sqlite_connect.assert_called_once()
+        other_connection.close()
+
+        connection_pool.close_all()
+        db_connection.close.assert_called_once()
 
     @mock.patch("sqlite3.connect")
     def test_commit(self, mock_sqlite_connect):
@@ -150,6 +287,14 @@ class TestDatabaseConnection:
         connection.execute("query2", ("arg1", "arg2"))
         cursor_mock.execute.assert_called_with("query2", ("arg1", "arg2"))
 
+    @mock.patch("sqlite3.connect")
+    def test_executemany(self, mock_sqlite_connect):
+        connection = DatabaseConnection()
+
+        cursor_mock = mock_sqlite_connect.return_value.cursor.return_value
+        connection.executemany("query", [("arg1",), ("arg2",)])
+        cursor_mock.executemany.assert_called_with("query", [("arg1",), ("arg2",)])
+
     @mock.patch("sqlite3.connect")
     def test_fetch_all(self, mock_sqlite_connect):
         connection = DatabaseConnection()
@@ -170,17 +315,23 @@ class TestDatabaseConnection:
         connection.ensure_tables()
 
         mock_cursor.execute.assert_called()
-        assert mock_cursor.execute.call_count == 2
+        assert mock_cursor.execute.call_count == 4
 
         # Three indexes: call number, args (0) or kwargs (1), call_args
         table_1 = mock_cursor.execute.call_args_list[0][0][0].strip()
         table_2 = mock_cursor.execute.call_args_list[1][0][0].strip()
+        table_3 = mock_cursor.execute.call_args_list[2][0][0].strip()
+        table_4 = mock_cursor.execute.call_args_list[3][0][0].strip()
 
         assert "CREATE TABLE IF NOT EXISTS" in table_1
         assert "CREATE TABLE IF NOT EXISTS" in table_2
+        assert "CREATE TABLE IF NOT EXISTS" in table_3
+        assert "CREATE TABLE IF NOT EXISTS" in table_4
 
         assert "'daily_menus'" in table_1
         assert "'update_control'" in table_2
+        assert "'parse_cache'" in table_3
+        assert "'http_cache'" in table_4
 
         assert "'id'" in table_1
         assert "'day'" in table_1
@@ -193,8 +344,175 @@ class TestDatabaseConnection:
 
         assert "'datetime'" in table_2
 
+        assert "'url'" in table_3
+        assert "'hash'" in table_3
+        assert "'menus'" in table_3
+
+        assert "'url'" in table_4
+        assert "'etag'" in table_4
+        assert "'last_modified'" in table_4
+        assert "'data'" in table_4
+
         assert ";" in table_1
         assert ";" in table_2
+        assert ";" in table_3
+        assert ";" in table_4
+
+
+class TestParseCache:
+    @pytest.fixture
+    def cache(self, tmp_path):
+        yield ParseCache(tmp_path / "cache.db")
+        connection_pool.close_all()
+
+    @pytest.fixture
+    def menus(self):
+        return [
+            DailyMenu(1, 1, 2003, Meal("a", "b"), Meal("c", "d"), "url"),
+            DailyMenu(2, 1, 2003, Meal("e"), url="url"),
+        ]
+
+    def test_hash_text(self):
+        assert ParseCache.hash_text("text") == ParseCache.hash_text("text")
+        assert ParseCache.hash_text("text") != ParseCache.hash_text("other text")
+
+    def test_get_not_cached(self, cache):
+        assert cache.get("url", "hash") is None
+
+    def test_set_get(self, cache, menus):
+        cache.set("url", "hash", menus)
+        assert cache.get("url", "hash") == menus
+        assert [x.url for x in cache.get("url", "hash")] == ["url", "url"]
+
+        assert cache.get("url", "other-hash") is None
+        assert cache.get("other-url", "hash") is None
+
+    def test_set_replaces(self, cache, menus):
+        cache.set("url", "hash", menus)
+        cache.set("url", "new-hash", menus[:1])
+
+        assert cache.get("url", "hash") is None
+        assert cache.get("url", "new-hash") == menus[:1]
+
+    def test_set_empty(self, cache):
+        cache.set("url", "hash", [])
+        assert cache.get("url", "hash") == []
+
+    def test_get_without_hash(self, cache, menus):
+        assert cache.get("url") is None
+
+        cache.set("url", "hash", menus)
+        assert cache.get("url") == menus
+
+    def test_plates_not_modified(self, cache):
+        menu = DailyMenu(1, 1, 2003, url="url")
+        menu.lunch.p1 = "PC: Plate"
+        cache.set("url", "hash", [menu])
+
+        assert cache.get("url", "hash")[0].lunch.p1 == "PC: Plate"
+
+    def test_no_app_context(self, cache, menus):
+        # ParseCache is used by the parser workers, outside the app context
+        cache.set("url", "hash", menus)
+        assert cache.get("url", "hash") == menus
+
+
+class TestHttpCache:
+    @pytest.fixture
+    def cache(self, tmp_path):
+        yield HttpCache(tmp_path / "cache.db")
+        connection_pool.close_all()
+
+    def test_get_not_cached(self, cache):
+        assert cache.get("url") is None
+
+    def test_set_get(self, cache):
+        cache.set("url", "etag", "last-modified")
+        assert cache.get("url") == HttpCacheEntry("etag", "last-modified", None)
+
+        cache.set("url", "etag-2", None, data=["a", "b"])
+        assert cache.get("url") == HttpCacheEntry("etag-2", None, ["a", "b"])
+        assert cache.get("other-url") is None
+
+    def test_set_without_validators(self, cache):
+        cache.set("url", "etag", "last-modified")
+        cache.set("url", None, None, data=["a"])
+
+        assert cache.get("url") is None
+
+
+class TestConnectionPool:
+    @pytest.fixture
+    def pool(self, tmp_path):
+        pool = ConnectionPool(size=2)
+        yield pool, tmp_path / "pool.db"
+        pool.close_all()
+
+    def test_schema_created_once(self, pool):
+        pool, path = pool
+
+        with mock.patch("app.menus.models.sqlite3.connect") as connect_mock:
+            pool.release(path, pool.acquire(path))
+            pool.close_all()
+            cursor_mock = connect_mock.return_value.cursor.return_value
+            assert cursor_mock.execute.call_count == 4
+
+        connection = pool.acquire(path)
+        connection.execute("SELECT * FROM 'daily_menus'")
+        connection.execute("SELECT * FROM 'update_control'")
+        connection.execute("SELECT * FROM 'parse_cache'")
+        connection.execute("SELECT * FROM 'http_cache'")
+
+        with mock.patch("app.menus.models.sqlite3.connect") as connect_mock:
+            pool.acquire(path)
+            connect_mock.assert_called_once()
+            connect_mock.return_value.cursor.assert_not_called()
+
+    def test_reuse(self, pool):
+        pool, path = pool
+        connection_1 = pool.acquire(path)
+        connection_2 = pool.acquire(path)
+        assert connection_1 is not connection_2
+
+        pool.release(path, connection_1)
+        assert pool.acquire(path) is connection_1
+
+    def test_bounded(self, pool):
+        pool, path = pool
+        connections = [pool.acquire(path) for _ in range(3)]
+
+        for connection in connections:
+            pool.release(path, connection)
+
+        # Pool size is 2, so the last connection is closed
+        with pytest.raises(sqlite3.ProgrammingError):
+            connections[-1].execute("SELECT 1")
+
+        connections[0].execute("SELECT 1")
+        connections[1].execute("SELECT 1")
+
+    def test_release_rollbacks(self, pool):
+        pool, path = pool
+        connection = pool.acquire(path)
+        connection.execute("INSERT INTO 'update_control' VALUES ('invalid')")
+        assert connection.in_transaction
+
+        pool.release(path, connection)
+        assert not connection.in_transaction
+
+        connection = pool.acquire(path)
+        assert connection.execute("SELECT * FROM 'update_control'").fetchall() == []
+
+    def test_close_all(self, pool):
+        pool, path = pool
+        connection = pool.acquire(path)
+        pool.release(path, connection)
+        pool.close_all()
+
+        with pytest.raises(sqlite3.ProgrammingError):
+            connection.execute("SELECT 1")
+
+        assert pool.acquire(path) is not connection
 
 
 class TestUpdateControl:
@@ -204,7 +522,6 @@ class TestUpdateControl:
         uc = UpdateControl()
 
         sqlite_mock.connect.assert_called_once()
-        sqlite_mock.connect.return_value.cursor.assert_called_once()
 
         yield sqlite_mock, uc
 
@@ -222,9 +539,8 @@ class TestUpdateControl:
         sqlite_mock, uc = uc_sqlite
         uc.close()
 
-        cursor_mock = sqlite_mock.connect.return_value.cursor.return_value
-        cursor_mock.close.assert_called_once()
-        sqlite_mock.connect.return_value.close.assert_called_once()
+        uc.connection.cursor.close.assert_called()
+        sqlite_mock.connect.return_value.close.assert_not_called()
 
     def test_commit(self, uc_sqlite):
         sqlite_mock, uc = uc_sqlite
@@ -243,11 +559,8 @@ class TestUpdateControl:
             assert isinstance(uc, UpdateControl)
 
         sqlite_mock.connect.assert_called_once()
-        sqlite_mock.connect.return_value.cursor.assert_called_once()
-
-        cursor_mock = sqlite_mock.connect.return_value.cursor.return_value
-        cursor_mock.close.assert_called_once()
-        sqlite_mock.connect.return_value.close.assert_called_once()
+        uc.connection.cursor.close.assert_called()
+        sqlite_mock.connect.return_value.close.assert_not_called()
 
     class TestShouldUpdate:
         @pytest.fixture(scope="function", autouse=True)
@@ -1,5 +1,6 @@
 import json
 import string
+from hashlib import sha1
 from enum import Enum
 from random import choice
 from unittest import mock
@@ -8,6 +9,8 @@ import pytest
 
 from app.menus.core.daily_menus_manager import DailyMenusManager
 from app.menus.core.structure import DailyMenu, Meal
+from app.menus.models import DailyMenusDatabaseController
+from app.menus.routes import _PayloadCache
 from app.utils import now
 
 
@@ -108,17 +111,12 @@ def test_do_not_use_force_or_reload(client):
 
 @mock.patch("app.menus.routes.DailyMenusManager", autospec=True)
 def test_menus_update(dmm_mock, client):
-    m = mock.Mock()
-    dmm_mock.load.return_value.__iter__.return_value = iter([m, m, m, m, m])
-
     rv = client.get("/menus/update")
     assert rv.status_code == 302
     assert rv.location == "http://menus.sralloza.es/menus"
 
     dmm_mock.load.assert_called_once_with(force=True)
-    dmm_mock.load.return_value.__iter__.assert_called_once()
-    m.to_database.assert_called()
-    assert m.to_database.call_count == 5
+    dmm_mock.load.return_value.save_to_database.assert_called_once_with()
 
 
 def test_today_redirect(client):
@@ -354,6 +352,140 @@ class TestApiMenus:
         dmm_mock.load.assert_called_once_with(force=True)
 
 
+class TestApiMenusCache:
+    @pytest.fixture(autouse=True)
+    def reset_cache(self):
+        _PayloadCache.payload = None
+        yield
+        _PayloadCache.payload = None
+
+    @pytest.fixture
+    def load_mock(self):
+        with mock.patch(
+            "app.menus.routes.DailyMenusManager.load",
+            wraps=DailyMenusManager.load,
+        ) as load_mock:
+            yield load_mock
+
+    @pytest.fixture
+    def today_saved(self, client):
+        today = now()
+        menu = DailyMenu(
+            today.day, today.month, today.year, Meal("a", "b"), Meal("c", "d")
+        )
+        DailyMenusDatabaseController.save_daily_menus([menu])
+        return menu
+
+    def test_headers(self, client, today_saved):
+        rv = client.get("/api/menus")
+
+        assert rv.status_code == 200
+        assert rv.headers["ETag"] == '"%s"' % sha1(rv.data).hexdigest()
+        assert "Last-Modified" in rv.headers
+        assert json.loads(rv.data.decode())[0]["id"] == today_saved.id
+
+    def test_not_modified(self, client, today_saved, load_mock):
+        rv = client.get("/api/menus")
+        etag = rv.headers["ETag"]
+
+        rv = client.get("/api/menus", headers={"If-None-Match": etag})
+        assert rv.status_code == 304
+        assert rv.data == b""
+        load_mock.assert_called_once_with(force=False)
+
+        rv = client.get("/api/menus", headers={"If-None-Match": '"other-etag"'})
+        assert rv.status_code == 200
+        load_mock.assert_called_once_with(force=False)
+
+    def test_cached_until_write(self, client, today_saved, load_mock):
+        rv_1 = client.get("/api/menus")
+        rv_2 = client.get("/api/menus")
+        assert rv_1.data == rv_2.data
+        load_mock.assert_called_once_with(force=False)
+
+        DailyMenusDatabaseController.save_daily_menus([DailyMenu(1, 1, 2000)])
+        rv_3 = client.get("/api/menus")
+
+        assert load_mock.call_count == 2
+        assert rv_3.headers["ETag"] != rv_1.headers["ETag"]
+        assert len(json.loads(rv_3.data.decode())) == 2
+
+    @mock.patch("app.menus.core.daily_menus_manager.UpdateControl.should_update")
+    def test_not_cached_without_today(self, su_mock, client, load_mock):
+        su_mock.return_value = False
+        DailyMenusDatabaseController.save_daily_menus([DailyMenu(1, 1, 2000)])
+
+        client.get("/api/menus")
+        client.get("/api/menus")
+        assert load_mock.call_count == 2
+
+
+class TestApiMenusPage:
+    @pytest.fixture(autouse=True)
+    def menus(self, client):
+        menus = [DailyMenu(e, 1, 2003, Meal("a", "b")) for e in range(1, 11)]
+        DailyMenusDatabaseController.save_daily_menus(menus)
+        return menus
+
+    @staticmethod
+    def get_days(rv):
+        return [int(x["day"].split()[-1]) for x in json.loads(rv.data.decode())]
+
+    @mock.patch("app.menus.routes.DailyMenusManager.load")
+    def test_range(self, load_mock, client):
+        rv = client.get("/api/menus?from=2003-01-03&to=2003-01-05")
+        assert rv.status_code == 200
+        assert self.get_days(rv) == [5, 4, 3]
+        assert "X-Next-Cursor" not in rv.headers
+        load_mock.assert_not_called()
+
+        rv = client.get("/api/menus?from=2003-01-08")
+        assert self.get_days(rv) == [10, 9, 8]
+
+        rv = client.get("/api/menus?to=2003-01-02")
+        assert self.get_days(rv) == [2, 1]
+
+    def test_pagination(self, client):
+        rv = client.get("/api/menus?limit=4")
+        assert self.get_days(rv) == [10, 9, 8, 7]
+        assert rv.headers["X-Next-Cursor"] == "20030107"
+
+        rv = client.get("/api/menus?limit=4&cursor=20030107")
+        assert self.get_days(rv) == [6, 5, 4, 3]
+        assert rv.headers["X-Next-Cursor"] == "20030103"
+
+        rv = client.get("/api/menus?limit=4&cursor=20030103")
+        assert self.get_days(rv) == [2, 1]
+        assert "X-Next-Cursor" not in rv.headers
+
+    def test_pagination_with_range(self, client):
+        rv = client.get("/api/menus?from=2003-01-03&to=2003-01-08&limit=3")
+        assert self.get_days(rv) == [8, 7, 6]
+        cursor = rv.headers["X-Next-Cursor"]
+
+        rv = client.get(
+            "/api/menus?from=2003-01-03&to=2003-01-08&limit=3&cursor=" + cursor
+        )
+        assert self.get_days(rv) == [5, 4, 3]
+        assert "X-Next-Cursor" not in rv.headers
+
+    @pytest.mark.parametrize(
+        "args",
+        [
+            "from=2003-13-01",
+            "to=yesterday",
+            "limit=0",
+            "limit=-3",
+            "limit=abc",
+            "cursor=abc",
+        ],
+    )
+    def test_invalid_args(self, client, args):
+        rv = client.get("/api/menus?" + args)
+        assert rv.status_code == 400
+        assert b"ValueError" in rv.data
+
+
 class TestAddMenuInterface:
     def test_get(self, client):
         rv = client.get("/add")
@@ -1,6 +1,6 @@
 import pytest
 
-from app.utils.exceptions import AppError, DownloaderError
+from app.utils.exceptions import AppError, CircuitOpenError, DownloaderError
 
 
 class TestAppError:
@@ -23,3 +23,14 @@ class TestDownloaderError:
     def test_raise(self):
         with pytest.raises(DownloaderError):
             raise DownloaderError
+
+
+class TestCircuitOpenError:
+    def test_inheritance(self):
+        exc = CircuitOpenError()
+        assert isinstance(exc, CircuitOpenError)
+        assert isinstance(exc, DownloaderError)
+
+    def test_raise(self):
+        with pytest.raises(DownloaderError):
+            raise CircuitOpenError
@@ -1,12 +1,14 @@
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from unittest import mock
 
 import pytest
+import requests
 from requests import exceptions as req_exc
 
 from app.utils import MetaSingleton
-from app.utils.exceptions import DownloaderError
-from app.utils.networking import USER_AGENT, Downloader
+from app.utils.exceptions import CircuitOpenError, DownloaderError
+from app.utils.networking import USER_AGENT, CircuitBreaker, Downloader, init_app
 
 REQUESTS_EXCEPTIONS = (
     req_exc.URLRequired,
@@ -36,10 +38,19 @@ class TestDownloader:
     def reset_singleton(self):
         Downloader._instance = None
 
+    @pytest.fixture(autouse=True)
+    def sleep_mock(self):
+        with mock.patch("app.utils.networking.time.sleep") as sleep_mock:
+            yield sleep_mock
+
     def test_init_declaration(self, *args):
         downloader = Downloader()
         assert hasattr(downloader, "logger")
         assert hasattr(downloader, "retries")
+        assert hasattr(downloader, "timeout")
+        assert hasattr(downloader, "backoff")
+        assert hasattr(downloader, "backoff_max")
+        assert isinstance(downloader.circuit_breaker, CircuitBreaker)
 
         assert downloader.headers["User-Agent"] == USER_AGENT
 
@@ -47,38 +58,154 @@ class TestDownloader:
         caplog.set_level(10)
         downloader = Downloader()
         downloader.get("some-url")
-        request_mock.assert_called_with("GET", "some-url", allow_redirects=True)
+        request_mock.assert_called_with(
+            "GET", "some-url", allow_redirects=True, timeout=(5, 30)
+        )
         assert "GET 'some-url'" in caplog.text
 
     def test_post(self, request_mock, caplog):
         caplog.set_level(10)
         downloader = Downloader()
         downloader.post("some-url", data="data", json="json")
-        request_mock.assert_called_with("POST", "some-url", data="data", json="json")
+        request_mock.assert_called_with(
+            "POST", "some-url", data="data", json="json", timeout=(5, 30)
+        )
         assert "POST 'some-url'" in caplog.text
 
     def test_delete(self, request_mock, caplog):
         caplog.set_level(10)
         downloader = Downloader()
         downloader.delete("some-url")
-        request_mock.assert_called_with("DELETE", "some-url")
+        request_mock.assert_called_with(
+            "DELETE", "some-url", timeout=(5, 30)
+        )
         assert "DELETE 'some-url'" in caplog.text
 
     def test_put(self, request_mock, caplog):
         caplog.set_level(10)
         downloader = Downloader()
         downloader.put("some-url", data="data")
-        request_mock.assert_called_with("PUT", "some-url", data="data")
+        request_mock.assert_called_with(
+            "PUT", "some-url", data="data", timeout=(5, 30)
+        )
         assert "PUT 'some-url'" in caplog.text
 
+    def test_conditional_get(self, request_mock):
+        downloader = Downloader()
+        downloader.conditional_get("some-url", "etag", "last-modified")
+        assert request_mock.call_args[0] == ("GET", "some-url")
+        assert request_mock.call_args[1]["headers"] == {
+            "If-None-Match": "etag",
+            "If-Modified-Since": "last-modified",
+        }
+
+        downloader.conditional_get("some-url", etag="etag", headers={"a": "b"})
+        assert request_mock.call_args[1]["headers"] == {
+            "a": "b",
+            "If-None-Match": "etag",
+        }
+
+    def test_conditional_get_without_validators(self, request_mock):
+        downloader = Downloader()
+        downloader.conditional_get("some-url")
+        assert request_mock.call_args[0] == ("GET", "some-url")
+        assert "headers" not in request_mock.call_args[1]
+
+    def test_get_validators(self, *args):
+        response = mock.MagicMock()
+        response.headers = {"ETag": "etag", "Last-Modified": "last-modified"}
+        assert Downloader.get_validators(response) == ("etag", "last-modified")
+
+        response.headers = {}
+        assert Downloader.get_validators(response) == (None, None)
+
     def test_head(self, request_mock, caplog):
         caplog.set_level(10)
         downloader = Downloader()
         downloader.head("some-url")
         # Default allow_redirects for HEAD is false
-        request_mock.assert_called_with("HEAD", "some-url", allow_redirects=False)
+        request_mock.assert_called_with(
+            "HEAD", "some-url", allow_redirects=False, timeout=(5, 30)
+        )
         assert "HEAD 'some-url'" in caplog.text
 
+    def test_session(self, *args):
+        downloader = Downloader(pool_connections=3, pool_maxsize=4)
+        session = downloader.session
+
+        assert isinstance(session, requests.Session)
+        assert downloader.session is session
+        assert session.headers["User-Agent"] == USER_AGENT
+
+        adapter = session.get_adapter("https://example.com")
+        assert adapter._pool_connections == 3
+        assert adapter._pool_maxsize == 4
+        assert session.get_adapter("http://example.com") is adapter
+
+    def test_session_per_thread(self, *args):
+        downloader = Downloader()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            sessions = list(executor.map(lambda _: downloader.session, range(2)))
+            # Same thread, same session
+            sessions += list(executor.map(lambda _: downloader.session, range(4)))
+
+        main_session = downloader.session
+        assert main_session not in sessions
+        assert len(set(map(id, sessions))) <= 2
+        assert len(downloader._sessions) == len(set(map(id, sessions))) + 1
+
+    def test_close(self, *args):
+        downloader = Downloader()
+        session = downloader.session
+
+        with mock.patch.object(session, "close") as close_mock:
+            downloader.close()
+
+        close_mock.assert_called_once_with()
+        assert downloader._sessions == []
+        assert downloader.session is not session
+
+    def test_timeout(self, request_mock):
+        downloader = Downloader(timeout=(1, 2))
+        downloader.get("some-url")
+        assert request_mock.call_args[1]["timeout"] == (1, 2)
+
+        downloader.get("some-url", timeout=3)
+        assert request_mock.call_args[1]["timeout"] == 3
+
+    def test_backoff(self, request_mock, sleep_mock):
+        request_mock.side_effect = [req_exc.ConnectionError] * 3 + ["response"]
+        downloader = Downloader(backoff=1, backoff_max=3)
+
+        with mock.patch("app.utils.networking.random.uniform") as uniform_mock:
+            uniform_mock.side_effect = lambda a, b: b
+            assert downloader.get("some-url") == "response"
+
+        delays = [x[0][0] for x in sleep_mock.call_args_list]
+        assert delays == [2, 3, 3]
+
+    def test_get_delay(self, *args):
+        downloader = Downloader(backoff=0.5, backoff_max=4)
+        for attempt in range(1, 10):
+            delay = downloader.get_delay(attempt)
+            assert 0 <= delay <= min(4, 0.5 * 2 ** attempt)
+
+    def test_circuit_breaker(self, request_mock, sleep_mock):
+        request_mock.side_effect = req_exc.ConnectionError
+        downloader = Downloader(retries=1)
+        downloader.circuit_breaker.threshold = 2
+
+        for _ in range(2):
+            with pytest.raises(DownloaderError, match="max retries"):
+                downloader.get("some-url")
+
+        assert request_mock.call_count == 4
+        assert downloader.circuit_breaker.state == CircuitBreaker.OPEN
+
+        with pytest.raises(CircuitOpenError):
+            downloader.get("some-url")
+        assert request_mock.call_count == 4
+
     @pytest.mark.parametrize("error_class", REQUESTS_EXCEPTIONS)
     @pytest.mark.parametrize("retries", range(1, 5))
     @pytest.mark.parametrize("nerrors", range(5))
@@ -112,3 +239,106 @@ class TestDownloader:
             assert logger_method_count["INFO"] == 0
             assert logger_method_count["WARNING"] == nerrors
             assert logger_method_count["CRITICAL"] == 0
+
+
+class TestCircuitBreaker:
+    @pytest.fixture
+    def monotonic_mock(self):
+        with mock.patch("app.utils.networking.time.monotonic") as monotonic_mock:
+            monotonic_mock.return_value = 1000
+            yield monotonic_mock
+
+    def test_attributes(self):
+        breaker = CircuitBreaker()
+        assert breaker.threshold == 3
+        assert breaker.cooldown == 300
+        assert breaker.failures == 0
+        assert breaker.opened_at is None
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_open(self, monotonic_mock):
+        breaker = CircuitBreaker(threshold=2, cooldown=10)
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert breaker.allow_request() is True
+
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        assert breaker.allow_request() is False
+
+    def test_success_resets_failures(self):
+        breaker = CircuitBreaker(threshold=2)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_half_open(self, monotonic_mock):
+        breaker = CircuitBreaker(threshold=1, cooldown=10)
+        breaker.record_failure()
+
+        monotonic_mock.return_value += 10
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+
+        # Only one trial request is allowed
+        assert breaker.allow_request() is True
+        assert breaker.allow_request() is False
+
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+
+        monotonic_mock.return_value += 10
+        assert breaker.allow_request() is True
+        breaker.record_success()
+
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert breaker.allow_request() is True
+        assert breaker.allow_request() is True
+
+    def test_get_status(self, monotonic_mock):
+        breaker = CircuitBreaker(threshold=1, cooldown=10)
+        assert breaker.get_status() == {
+            "state": "closed",
+            "failures": 0,
+            "retry_in": None,
+        }
+
+        breaker.record_failure()
+        monotonic_mock.return_value += 4
+        assert breaker.get_status() == {"state": "open", "failures": 1, "retry_in": 6}
+
+        monotonic_mock.return_value += 20
+        assert breaker.get_status() == {
+            "state": "half-open",
+            "failures": 1,
+            "retry_in": 0,
+        }
+
+
+def test_init_app():
+    app_mock = mock.MagicMock()
+    app_mock.config = {
+        "DOWNLOADER_RETRIES": 1,
+        "DOWNLOADER_CONNECT_TIMEOUT": 2,
+        "DOWNLOADER_READ_TIMEOUT": 3,
+        "DOWNLOADER_BACKOFF": 4,
+        "DOWNLOADER_BACKOFF_MAX": 5,
+        "CIRCUIT_BREAKER_THRESHOLD": 6,
+        "CIRCUIT_BREAKER_COOLDOWN": 7,
+        "DOWNLOADER_POOL_CONNECTIONS": 8,
+        "DOWNLOADER_POOL_MAXSIZE": 9,
+    }
+
+    with mock.patch("app.utils.networking.downloader") as downloader_mock:
+        init_app(app_mock)
+
+    assert downloader_mock.retries == 1
+    assert downloader_mock.timeout == (2, 3)
+    assert downloader_mock.backoff == 4
+    assert downloader_mock.backoff_max == 5
+    assert downloader_mock.circuit_breaker.threshold == 6
+    assert downloader_mock.circuit_breaker.cooldown == 7
+    assert downloader_mock.pool_connections == 8
+    assert downloader_mock.pool_maxsize == 9
+    downloader_mock.close.assert_called_once_with()
@@ -2,7 +2,7 @@ from unittest import mock
 
 import pytest
 
-from app.utils import MetaSingleton, Tokens, Translator, get_post_arg
+from app.utils import FileLock, MetaSingleton, Tokens, Translator, get_post_arg
 
 
 class TestTranslator:
@@ -229,3 +229,31 @@ def test_singleton():
     assert h1.value == "h1"
     assert h2.value == "h1"
     assert h1 is h2
+
+
+class TestFileLock:
+    @pytest.fixture
+    def path(self, tmp_path):
+        return tmp_path / "file.lock"
+
+    def test_acquire_release(self, path):
+        lock_1 = FileLock(path)
+        lock_2 = FileLock(path)
+
+        assert lock_1.acquire(blocking=False) is True
+        assert path.exists()
+        assert lock_2.acquire(blocking=False) is False
+
+        lock_1.release()
+        assert lock_2.acquire(blocking=False) is True
+        lock_2.release()
+
+    def test_context_manager(self, path):
+        with FileLock(path) as lock:
+            assert isinstance(lock, FileLock)
+            assert FileLock(path).acquire(blocking=False) is False
+
+        assert FileLock(path).acquire(blocking=False) is True
+
+    def test_release_without_acquire(self, path):
+        FileLock(path).release()
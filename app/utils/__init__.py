@@ -2,6 +2,12 @@
 import logging
 import re
 from datetime import datetime
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
 
 from bs4 import BeautifulSoup as Soup
 from flask import current_app, request
@@ -211,3 +217,59 @@ class MetaSingleton(type):
         # Uncomment line to check possible singleton errors
         # logger.info("Requested Connection (id=%d)", id(cls._instance))
         return cls._instance
+
+
+class FileLock:
+    """Lock shared between processes, using `fcntl.flock` over a file.
+    In systems without `fcntl` (Windows) it doesn't lock anything.
+
+    Args:
+        path (str or pathlib.Path): path of the lock file.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+    def acquire(self, blocking=True):
+        """Acquires the lock.
+
+        Args:
+            blocking (bool, optional): if False and the lock is held by other
+                process, it returns False instead of waiting. Defaults to True.
+
+        Returns:
+            bool: True if the lock was acquired, False otherwise.
+        """
+        self._file = self.path.open("a")
+
+        if fcntl is None:
+            return True
+
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.flock(self._file.fileno(), flags)
+        except BlockingIOError:
+            self._file.close()
+            self._file = None
+            return False
+
+        return True
+
+    def release(self):
+        """Releases the lock."""
+        if self._file is None:
+            return
+
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+        self._file.close()
+        self._file = None
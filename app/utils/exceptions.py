@@ -4,3 +4,7 @@ class AppError(Exception):
 
 class DownloaderError(AppError):
     """Downloader error."""
+
+
+class CircuitOpenError(DownloaderError):
+    """The request was not made because the circuit breaker is open."""
@@ -1,9 +1,14 @@
 """Custom downloader with retries control."""
+import atexit
 import logging
+import random
+import time
+from threading import Lock, local
 
 import requests
+from requests.adapters import HTTPAdapter
 
-from .exceptions import DownloaderError
+from .exceptions import CircuitOpenError, DownloaderError
 from . import MetaSingleton
 
 logger = logging.getLogger(__name__)
@@ -14,31 +19,299 @@ USER_AGENT = (
 )
 
 
-class Downloader(requests.Session, metaclass=MetaSingleton):
-    """Downloader with retries control."""
+class CircuitBreaker:
+    """Stops the requests for `cooldown` seconds after `threshold` consecutive
+    failed requests, so a server which is down is not hammered.
 
-    def __init__(self, retries=5):
+    When the cooldown ends, the circuit is half-open: one request is allowed,
+    and if it fails the circuit is opened again.
+
+    Args:
+        threshold (int, optional): consecutive failures needed to open the
+            circuit. Defaults to 3.
+        cooldown (float, optional): seconds the circuit stays open.
+            Defaults to 300.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, threshold=3, cooldown=300):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = Lock()
+
+    @property
+    def state(self):
+        """Returns the state of the circuit."""
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def allow_request(self):
+        """Returns whether a request can be made now."""
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.OPEN or self._trial:
+                return False
+
+            self._trial = True
+            return True
+
+    def record_success(self):
+        """Closes the circuit."""
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        """Counts a failed request, opening the circuit if needed."""
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+    def get_status(self):
+        """Returns the status of the circuit, for monitoring.
+
+        Returns:
+            dict: state, consecutive failures and seconds left to retry.
+        """
+        retry_in = None
+        if self.opened_at is not None:
+            retry_in = max(self.cooldown - (time.monotonic() - self.opened_at), 0)
+
+        return {"state": self.state, "failures": self.failures, "retry_in": retry_in}
+
+
+class Downloader(metaclass=MetaSingleton):
+    """Downloader with retries control, safe to be used by multiple threads.
+
+    `requests.Session` is not thread-safe, so each thread uses its own session
+    (created the first time it makes a request), which keeps its connections
+    alive. The connection pool of each session is set by `pool_connections`
+    (number of hosts) and `pool_maxsize` (connections per host).
+
+    Failed attempts are retried after a jittered exponential backoff, and the
+    requests are short-circuited by a `CircuitBreaker` while the server is down.
+
+    Args:
+        retries (int, optional): retries of each request. Defaults to 5.
+        timeout (tuple, optional): connect and read timeouts, in seconds.
+            Defaults to (5, 30).
+        backoff (float, optional): base delay between retries, in seconds.
+            Defaults to 0.5.
+        backoff_max (float, optional): maximum delay between retries, in
+            seconds. Defaults to 30.
+        pool_connections (int, optional): number of hosts whose connections
+            are kept by each session. Defaults to 10.
+        pool_maxsize (int, optional): connections kept for each host by each
+            session. Defaults to 10.
+    """
+
+    def __init__(
+        self,
+        retries=5,
+        timeout=(5, 30),
+        backoff=0.5,
+        backoff_max=30,
+        pool_connections=10,
+        pool_maxsize=10,
+    ):
         self.logger = logging.getLogger(__name__)
         self.retries = retries
+        self.timeout = timeout
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.circuit_breaker = CircuitBreaker()
+        self.headers = {"User-Agent": USER_AGENT}
+
+        self._local = local()
+        self._sessions = []
+        self._lock = Lock()
+
+    @property
+    def session(self):
+        """Returns the session of the current thread, creating it if needed."""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self.create_session()
+            self._local.session = session
+            with self._lock:
+                self._sessions.append(session)
+
+        return session
+
+    def create_session(self):
+        """Returns a new session, with the downloader's headers and
+        connection pool.
+
+        Returns:
+            requests.Session: new session.
+        """
+        session = requests.Session()
+        session.headers.update(self.headers)
+
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def close(self):
+        """Closes the sessions of every thread. Threads will create new
+        sessions if they make more requests."""
+        with self._lock:
+            sessions, self._sessions = self._sessions, []
+            self._local = local()
 
-        super().__init__()
-        self.headers.update({"User-Agent": USER_AGENT})
+        for session in sessions:
+            session.close()
+
+    def get_delay(self, attempt):
+        """Returns the delay before a retry ("full jitter" backoff).
+
+        Args:
+            attempt (int): number of failed attempts (starting at 1).
+
+        Returns:
+            float: delay, in seconds.
+        """
+        return random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt))
 
     def request(self, method, url, **kwargs):
+        """Sends a request using the session of the current thread.
+
+        Raises:
+            CircuitOpenError: if the circuit breaker is open.
+            DownloaderError: if every attempt fails.
+        """
         self.logger.debug("%s %r", method, url)
+
+        if not self.circuit_breaker.allow_request():
+            self.logger.warning("Circuit open, skipped %s %r", method, url)
+            raise CircuitOpenError("circuit open (%s %r)" % (method, url))
+
+        kwargs.setdefault("timeout", self.timeout)
         retries = self.retries
+        attempt = 0
+
+        session = self.session
 
         while retries >= 0:
             try:
-                return super().request(method, url, **kwargs)
+                response = session.request(method, url, **kwargs)
+                self.circuit_breaker.record_success()
+                return response
             except requests.exceptions.RequestException as exc:
                 retries -= 1
+                attempt += 1
                 self.logger.warning(
                     "%s in %s, retries=%s", type(exc).__name__, method, retries
                 )
 
+                if retries >= 0:
+                    time.sleep(self.get_delay(attempt))
+
+        self.circuit_breaker.record_failure()
         self.logger.critical("Download error in %s %r", method, url)
         raise DownloaderError("max retries failed.")
 
+    def get(self, url, **kwargs):
+        """Sends a GET request."""
+        kwargs.setdefault("allow_redirects", True)
+        return self.request("GET", url, **kwargs)
+
+    def head(self, url, **kwargs):
+        """Sends a HEAD request."""
+        kwargs.setdefault("allow_redirects", False)
+        return self.request("HEAD", url, **kwargs)
+
+    def post(self, url, data=None, json=None, **kwargs):
+        """Sends a POST request."""
+        return self.request("POST", url, data=data, json=json, **kwargs)
+
+    def put(self, url, data=None, **kwargs):
+        """Sends a PUT request."""
+        return self.request("PUT", url, data=data, **kwargs)
+
+    def delete(self, url, **kwargs):
+        """Sends a DELETE request."""
+        return self.request("DELETE", url, **kwargs)
+
+    def conditional_get(self, url, etag=None, last_modified=None, **kwargs):
+        """Sends a GET request which is only answered with the content if it
+        has changed (`If-None-Match` and `If-Modified-Since`). Otherwise, the
+        server answers `304 Not Modified` without content.
+
+        Args:
+            url (str): url to download.
+            etag (str, optional): `ETag` of the last response. Defaults to None.
+            last_modified (str, optional): `Last-Modified` of the last response.
+                Defaults to None.
+            **kwargs: passed to `get`.
+
+        Returns:
+            requests.Response: response of the server.
+        """
+        if etag or last_modified:
+            headers = dict(kwargs.pop("headers", None) or {})
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+            kwargs["headers"] = headers
+
+        return self.get(url, **kwargs)
+
+    @staticmethod
+    def get_validators(response):
+        """Returns the validators of the response.
+
+        Args:
+            response (requests.Response): response of the server.
+
+        Returns:
+            tuple: `ETag` and `Last-Modified` headers (None if not sent).
+        """
+        return response.headers.get("ETag"), response.headers.get("Last-Modified")
+
 
 downloader = Downloader()
+atexit.register(downloader.close)
+
+
+def init_app(flask_app):
+    """Configures the downloader with the application's config.
+
+    Args:
+        flask_app (flask.Flask): application.
+    """
+    config = flask_app.config
+    downloader.retries = config["DOWNLOADER_RETRIES"]
+    downloader.timeout = (
+        config["DOWNLOADER_CONNECT_TIMEOUT"],
+        config["DOWNLOADER_READ_TIMEOUT"],
+    )
+    downloader.backoff = config["DOWNLOADER_BACKOFF"]
+    downloader.backoff_max = config["DOWNLOADER_BACKOFF_MAX"]
+    downloader.circuit_breaker.threshold = config["CIRCUIT_BREAKER_THRESHOLD"]
+    downloader.circuit_breaker.cooldown = config["CIRCUIT_BREAKER_COOLDOWN"]
+    downloader.pool_connections = config["DOWNLOADER_POOL_CONNECTIONS"]
+    downloader.pool_maxsize = config["DOWNLOADER_POOL_MAXSIZE"]
+
+    # Sessions created before are replaced by sessions with the new pool size
+    downloader.close()